@@ -0,0 +1,598 @@
+import json
+import os
+import hmac
+import time
+import threading
+import weakref
+import psycopg2
+from psycopg2.errors import InvalidSqlStatementName, DuplicatePreparedStatement
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+import jwt
+
+MIN_COHORT_SIZE = int(os.environ.get('ANALYTICS_MIN_COHORT', '50'))
+MIN_CELL_COUNT = 10
+REFRESH_BATCH_SIZE = 50000
+INGEST_LAG = '10 minutes'
+
+AGE_BANDS = ('under_20', '20-24', '25-29', '30-34', '35-39', '40-44', '45+')
+
+HISTOGRAM_RANGES = {
+    'cycle_length': (15, 60),
+    'period_length': (1, 15)
+}
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+AGE_BAND_SQL = """
+    CASE
+        WHEN age < 20 THEN 'under_20'
+        WHEN age < 25 THEN '20-24'
+        WHEN age < 30 THEN '25-29'
+        WHEN age < 35 THEN '30-34'
+        WHEN age < 40 THEN '35-39'
+        WHEN age < 45 THEN '40-44'
+        ELSE '45+'
+    END
+"""
+
+STATEMENTS = {
+    'analytics_cohort_size': (('text', 'text[]'), """
+        SELECT COUNT(DISTINCT user_id) FROM cohort_members WHERE metric = $1 AND age_band = ANY($2)
+    """),
+    'analytics_histogram': (('text', 'text[]'), """
+        SELECT bucket, SUM(count)
+        FROM cohort_histograms
+        WHERE metric = $1 AND age_band = ANY($2)
+        GROUP BY bucket
+        ORDER BY bucket
+    """),
+    'analytics_symptom_counts': (('text[]', 'integer'), """
+        SELECT symptom_type, phase, SUM(count)
+        FROM cohort_symptom_counts
+        WHERE age_band = ANY($1)
+        GROUP BY symptom_type, phase
+        HAVING SUM(count) >= $2
+        ORDER BY symptom_type, phase
+    """)
+}
+
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_statement_stats = {}
+_stats_lock = threading.Lock()
+
+
+def handler(event: dict, context) -> dict:
+    """
+    Обезличенная статистика циклов по возрастным когортам:
+    - Перцентили длины цикла и менструации из гистограмм
+    - Частота симптомов по фазам цикла
+    - Инкрементальное обновление гистограмм по расписанию
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return cors_response()
+
+    try:
+        if method == 'POST':
+            if not is_refresh_authorized(event):
+                return error_response('Forbidden', 403)
+            return json_response(refresh_statistics())
+
+        get_user_from_token(event)
+
+        if method == 'GET':
+            params = event.get('queryStringParameters', {}) or {}
+            metric = params.get('metric', 'cycle_length')
+            age_band = params.get('ageBand', 'all')
+
+            if age_band != 'all' and age_band not in AGE_BANDS:
+                return error_response(f'Unknown ageBand: {age_band}', 400)
+
+            if metric == 'symptoms':
+                return get_symptom_stats(age_band)
+            elif metric in HISTOGRAM_RANGES:
+                return get_metric_stats(metric, age_band)
+            return error_response(f'Unknown metric: {metric}', 400)
+        else:
+            return error_response('Method not allowed', 405)
+
+    except ValueError as e:
+        return error_response(str(e), 401)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+def get_metric_stats(metric: str, age_band: str) -> dict:
+    """Перцентили из гистограммы когорты; 'all' сливает гистограммы всех когорт"""
+    bands = list(AGE_BANDS) if age_band == 'all' else [age_band]
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        cohort_size = get_cohort_size(cur, metric, bands)
+        if cohort_size < MIN_COHORT_SIZE:
+            return json_response({'metric': metric, 'ageBand': age_band, 'suppressed': True})
+
+        execute_statement(cur, 'analytics_histogram', (metric, bands))
+
+        histogram = [(row[0], int(row[1])) for row in cur.fetchall()]
+        total = sum(count for _, count in histogram)
+
+        return json_response({
+            'metric': metric,
+            'ageBand': age_band,
+            'suppressed': False,
+            'cohortSize': cohort_size,
+            'samples': total,
+            'mean': round(sum(b * c for b, c in histogram) / total, 2) if total else None,
+            'percentiles': {f'p{p}': histogram_percentile(histogram, total, p) for p in PERCENTILES}
+        })
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_symptom_stats(age_band: str) -> dict:
+    """Частота симптомов по фазам; малые ячейки скрываются"""
+    bands = list(AGE_BANDS) if age_band == 'all' else [age_band]
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        cohort_size = get_cohort_size(cur, 'symptoms', bands)
+        if cohort_size < MIN_COHORT_SIZE:
+            return json_response({'metric': 'symptoms', 'ageBand': age_band, 'suppressed': True})
+
+        execute_statement(cur, 'analytics_symptom_counts', (bands, MIN_CELL_COUNT))
+
+        symptoms = {}
+        for row in cur.fetchall():
+            symptoms.setdefault(row[0], {})[row[1]] = int(row[2])
+
+        return json_response({
+            'metric': 'symptoms',
+            'ageBand': age_band,
+            'suppressed': False,
+            'cohortSize': cohort_size,
+            'symptoms': symptoms
+        })
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_cohort_size(cur, metric: str, bands: list) -> int:
+    """Число пользователей, чьи данные вошли именно в эту метрику"""
+    execute_statement(cur, 'analytics_cohort_size', (metric, bands))
+    return cur.fetchone()[0]
+
+
+def histogram_percentile(histogram: list, total: int, percentile: int) -> int:
+    """Перцентиль по гистограмме с шагом в один день"""
+    if not total:
+        return None
+    rank = total * percentile / 100
+    seen = 0
+    for bucket, count in histogram:
+        seen += count
+        if seen >= rank:
+            return bucket
+    return histogram[-1][0]
+
+
+def refresh_statistics() -> dict:
+    """
+    Досчитывает статистику по строкам cycles и daily_logs, измененным после
+    watermark (updated_at, id). Вклад каждого цикла и дня хранится отдельно:
+    при изменении старый вклад вычитается, новый прибавляется. Берутся только
+    строки старше INGEST_LAG, чтобы не пропустить еще не закоммиченные
+    транзакции. Учитываются пользователи с data_sharing; изменение настройки
+    в user_settings отзывает или возвращает весь вклад пользователя.
+    """
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        cycles = ingest_cycles(conn, cur)
+        days = ingest_symptoms(conn, cur)
+        settings = ingest_settings(conn, cur)
+        return {'cycles': cycles, 'days': days, 'settings': settings}
+    finally:
+        cur.close()
+        conn.close()
+
+
+def claim_changes(cur, source: str, columns: str) -> bool:
+    """
+    Блокирует watermark источника и кладет следующую пачку измененных строк
+    в analytics_changed; False, если изменений нет
+    """
+    cur.execute("""
+        SELECT last_updated_at, last_id FROM analytics_watermarks WHERE source = %s FOR UPDATE
+    """, (source,))
+    last_updated_at, last_id = cur.fetchone()
+
+    cur.execute(f"""
+        CREATE TEMP TABLE analytics_changed ON COMMIT DROP AS
+        SELECT {columns}, updated_at FROM {source}
+        WHERE (updated_at, id) > (%s, %s) AND updated_at < NOW() - INTERVAL '{INGEST_LAG}'
+        ORDER BY updated_at, id
+        LIMIT %s
+    """, (last_updated_at, last_id, REFRESH_BATCH_SIZE))
+
+    cur.execute("SELECT updated_at, id FROM analytics_changed ORDER BY updated_at DESC, id DESC LIMIT 1")
+    last = cur.fetchone()
+    if not last:
+        return False
+
+    cur.execute("""
+        UPDATE analytics_watermarks SET last_updated_at = %s, last_id = %s, updated_at = NOW()
+        WHERE source = %s
+    """, (last[0], last[1], source))
+    return True
+
+
+def refresh_members(cur, metric: str, members_sql: str) -> None:
+    """Пересобирает участников метрики для пользователей из analytics_changed"""
+    cur.execute("""
+        DELETE FROM cohort_members
+        WHERE metric = %s AND user_id IN (SELECT user_id FROM analytics_changed)
+    """, (metric,))
+    cur.execute(f"""
+        INSERT INTO cohort_members (metric, age_band, user_id)
+        SELECT %s, age_band, user_id FROM ({members_sql}) m
+        ON CONFLICT DO NOTHING
+    """, (metric,))
+
+
+def ingest_cycles(conn, cur) -> int:
+    """Циклы: длины, заполненные позже через PUT, заменяют прежний вклад"""
+    ingested = 0
+
+    while True:
+        if not claim_changes(cur, 'cycles', 'id, user_id'):
+            conn.rollback()
+            return ingested
+
+        apply_cycle_changes(cur)
+
+        cur.execute("SELECT COUNT(*) FROM analytics_changed")
+        ingested += cur.fetchone()[0]
+        conn.commit()
+
+
+def apply_cycle_changes(cur) -> None:
+    """Заменяет вклад циклов из analytics_changed (id, user_id) их текущим вкладом"""
+    cur.execute(f"""
+        CREATE TEMP TABLE analytics_batch ON COMMIT DROP AS
+        SELECT cycle_id, user_id, cycle_length, period_length, {AGE_BAND_SQL} AS age_band
+        FROM (
+            SELECT c.id AS cycle_id, c.user_id, c.cycle_length, c.period_length,
+                   date_part('year', age(c.start_date, p.date_of_birth)) AS age
+            FROM analytics_changed ch
+            JOIN cycles c ON c.id = ch.id
+            JOIN user_settings s ON s.user_id = c.user_id AND s.data_sharing
+            JOIN LATERAL (
+                SELECT date_of_birth FROM user_profiles
+                WHERE user_id = c.user_id AND date_of_birth IS NOT NULL
+                LIMIT 1
+            ) p ON true
+        ) src
+    """)
+
+    for metric, (lowest, highest) in HISTOGRAM_RANGES.items():
+        cur.execute(f"""
+            INSERT INTO cohort_histograms (age_band, metric, bucket, count)
+            SELECT age_band, %s, bucket, SUM(delta)
+            FROM (
+                SELECT age_band, LEAST(GREATEST({metric}, %s), %s) AS bucket, -1 AS delta
+                FROM cohort_cycle_contributions
+                WHERE cycle_id IN (SELECT id FROM analytics_changed) AND {metric} IS NOT NULL
+                UNION ALL
+                SELECT age_band, LEAST(GREATEST({metric}, %s), %s), 1
+                FROM analytics_batch
+                WHERE {metric} IS NOT NULL
+            ) changes
+            GROUP BY age_band, bucket
+            HAVING SUM(delta) <> 0
+            ON CONFLICT (age_band, metric, bucket)
+            DO UPDATE SET count = cohort_histograms.count + EXCLUDED.count
+        """, (metric, lowest, highest, lowest, highest))
+
+    cur.execute("""
+        DELETE FROM cohort_cycle_contributions WHERE cycle_id IN (SELECT id FROM analytics_changed)
+    """)
+    cur.execute("""
+        INSERT INTO cohort_cycle_contributions (cycle_id, user_id, age_band, cycle_length, period_length)
+        SELECT cycle_id, user_id, age_band, cycle_length, period_length FROM analytics_batch
+    """)
+
+    for metric in HISTOGRAM_RANGES:
+        refresh_members(cur, metric, f"""
+            SELECT DISTINCT age_band, user_id FROM cohort_cycle_contributions
+            WHERE user_id IN (SELECT user_id FROM analytics_changed) AND {metric} IS NOT NULL
+        """)
+
+
+def ingest_symptoms(conn, cur) -> int:
+    """
+    Симптомы пересчитываются по дням: save_daily_log обновляет daily_logs и
+    заменяет симптомы дня целиком, поэтому измененный день пересобирается,
+    а каждый тип симптома учитывается один раз за день
+    """
+    ingested = 0
+
+    while True:
+        if not claim_changes(cur, 'daily_logs', 'id, user_id, log_date'):
+            conn.rollback()
+            return ingested
+
+        apply_symptom_changes(cur)
+
+        cur.execute("SELECT COUNT(*) FROM analytics_changed")
+        ingested += cur.fetchone()[0]
+        conn.commit()
+
+
+def apply_symptom_changes(cur) -> None:
+    """Заменяет вклад дней из analytics_changed (user_id, log_date) их текущим вкладом"""
+    cur.execute(f"""
+        CREATE TEMP TABLE analytics_batch ON COMMIT DROP AS
+        SELECT user_id, log_date, symptom_type, {AGE_BAND_SQL} AS age_band,
+               CASE
+                   WHEN cycle_day <= period_length THEN 'menstruation'
+                   WHEN cycle_day <= 13 THEN 'follicular'
+                   WHEN cycle_day <= 16 THEN 'ovulation'
+                   ELSE 'luteal'
+               END AS phase
+        FROM (
+            SELECT DISTINCT ON (s.user_id, s.log_date, s.symptom_type)
+                   s.user_id, s.log_date, s.symptom_type,
+                   s.log_date - c.start_date AS cycle_day,
+                   COALESCE(c.period_length, 5) AS period_length,
+                   date_part('year', age(s.log_date, p.date_of_birth)) AS age
+            FROM analytics_changed ch
+            JOIN symptoms s ON s.user_id = ch.user_id AND s.log_date = ch.log_date
+            JOIN user_settings us ON us.user_id = s.user_id AND us.data_sharing
+            JOIN LATERAL (
+                SELECT date_of_birth FROM user_profiles
+                WHERE user_id = s.user_id AND date_of_birth IS NOT NULL
+                LIMIT 1
+            ) p ON true
+            JOIN LATERAL (
+                SELECT start_date, period_length FROM cycles
+                WHERE user_id = s.user_id AND start_date <= s.log_date
+                ORDER BY start_date DESC
+                LIMIT 1
+            ) c ON true
+            WHERE s.symptom_type IS NOT NULL AND s.log_date - c.start_date < 60
+        ) src
+    """)
+
+    cur.execute("""
+        INSERT INTO cohort_symptom_counts (age_band, symptom_type, phase, count)
+        SELECT age_band, symptom_type, phase, SUM(delta)
+        FROM (
+            SELECT sc.age_band, sc.symptom_type, sc.phase, -1 AS delta
+            FROM cohort_symptom_contributions sc
+            JOIN analytics_changed ch ON ch.user_id = sc.user_id AND ch.log_date = sc.log_date
+            UNION ALL
+            SELECT age_band, symptom_type, phase, 1
+            FROM analytics_batch
+        ) changes
+        GROUP BY age_band, symptom_type, phase
+        HAVING SUM(delta) <> 0
+        ON CONFLICT (age_band, symptom_type, phase)
+        DO UPDATE SET count = cohort_symptom_counts.count + EXCLUDED.count
+    """)
+
+    cur.execute("""
+        DELETE FROM cohort_symptom_contributions sc
+        USING analytics_changed ch
+        WHERE ch.user_id = sc.user_id AND ch.log_date = sc.log_date
+    """)
+    cur.execute("""
+        INSERT INTO cohort_symptom_contributions (user_id, log_date, symptom_type, age_band, phase)
+        SELECT user_id, log_date, symptom_type, age_band, phase FROM analytics_batch
+    """)
+
+    refresh_members(cur, 'symptoms', """
+        SELECT DISTINCT age_band, user_id FROM cohort_symptom_contributions
+        WHERE user_id IN (SELECT user_id FROM analytics_changed)
+    """)
+
+
+def ingest_settings(conn, cur) -> int:
+    """
+    Отказ от data_sharing отзывает весь вклад пользователя, повторное
+    согласие возвращает его. Пересобираются только пользователи, у которых
+    настройка расходится с тем, участвуют ли они сейчас в статистике.
+    """
+    ingested = 0
+
+    while True:
+        # Те же строки меняют ingest_cycles и ingest_symptoms: их watermark
+        # блокируется первым, чтобы вклад не пересчитывался параллельно
+        cur.execute("""
+            SELECT source FROM analytics_watermarks
+            WHERE source IN ('cycles', 'daily_logs')
+            ORDER BY source
+            FOR UPDATE
+        """)
+        if not claim_changes(cur, 'user_settings', 'id, user_id, data_sharing'):
+            conn.rollback()
+            return ingested
+
+        cur.execute("SELECT COUNT(*) FROM analytics_changed")
+        ingested += cur.fetchone()[0]
+
+        cur.execute("""
+            CREATE TEMP TABLE analytics_users ON COMMIT DROP AS
+            SELECT DISTINCT user_id FROM analytics_changed ch
+            WHERE COALESCE(ch.data_sharing, false) <> (
+                EXISTS (SELECT 1 FROM cohort_members WHERE user_id = ch.user_id)
+                OR EXISTS (SELECT 1 FROM cohort_cycle_contributions WHERE user_id = ch.user_id)
+                OR EXISTS (SELECT 1 FROM cohort_symptom_contributions WHERE user_id = ch.user_id)
+            )
+        """)
+        cur.execute("DROP TABLE analytics_changed")
+
+        cur.execute("""
+            CREATE TEMP TABLE analytics_changed ON COMMIT DROP AS
+            SELECT id, user_id FROM cycles WHERE user_id IN (SELECT user_id FROM analytics_users)
+            UNION
+            SELECT cycle_id, user_id FROM cohort_cycle_contributions
+            WHERE user_id IN (SELECT user_id FROM analytics_users)
+        """)
+        apply_cycle_changes(cur)
+        cur.execute("DROP TABLE analytics_changed, analytics_batch")
+
+        cur.execute("""
+            CREATE TEMP TABLE analytics_changed ON COMMIT DROP AS
+            SELECT user_id, log_date FROM symptoms WHERE user_id IN (SELECT user_id FROM analytics_users)
+            UNION
+            SELECT user_id, log_date FROM cohort_symptom_contributions
+            WHERE user_id IN (SELECT user_id FROM analytics_users)
+        """)
+        apply_symptom_changes(cur)
+
+        conn.commit()
+
+
+def is_refresh_authorized(event: dict) -> bool:
+    """Обновление запускается по расписанию с ключом ANALYTICS_REFRESH_KEY"""
+    expected = os.environ.get('ANALYTICS_REFRESH_KEY')
+    headers = event.get('headers', {}) or {}
+    provided = headers.get('x-analytics-key') or headers.get('X-Analytics-Key') or ''
+    return bool(expected) and hmac.compare_digest(provided, expected)
+
+
+def execute_statement(cur, name: str, params: tuple) -> None:
+    """
+    Выполняет запрос из STATEMENTS как подготовленный на сервере.
+    При первом использовании на соединении PREPARE уходит отдельным
+    обращением, и имя отмечается сразу после него: подготовленный запрос
+    остается на сервере, даже если EXECUTE или вся транзакция затем упадет.
+    Если сервер потерял подготовленный запрос (соединение пересоздано или
+    сброшено пулером), он готовится заново; если запрос уже подготовлен,
+    хотя не отмечен, отметка восстанавливается. Повтор возможен только вне
+    транзакции, иначе ошибка пробрасывается, а следующий вызов уже пойдет
+    верным путем.
+    """
+    conn = cur.connection
+    with _prepared_lock:
+        state = _prepared.get(conn)
+        if state is None or state[0] != conn.info.backend_pid:
+            state = (conn.info.backend_pid, set())
+            _prepared[conn] = state
+
+    idle = conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    start = time.perf_counter()
+
+    try:
+        run_prepared(cur, name, params, state[1])
+    except InvalidSqlStatementName:
+        state[1].discard(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+    except DuplicatePreparedStatement:
+        state[1].add(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+
+    record_statement(name, time.perf_counter() - start)
+
+
+def run_prepared(cur, name: str, params: tuple, prepared: set) -> None:
+    """PREPARE с явными типами параметров: без них $n в выражениях выводятся неверно"""
+    types, sql = STATEMENTS[name]
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}")
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def record_statement(name: str, elapsed: float) -> None:
+    with _stats_lock:
+        stats = _statement_stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def statement_stats() -> list:
+    """Число вызовов и время по каждому запросу из STATEMENTS, самые дорогие первыми"""
+    with _stats_lock:
+        rows = [{
+            'statement': name,
+            'calls': calls,
+            'totalMs': round(total * 1000, 3),
+            'avgMs': round(total * 1000 / calls, 3),
+            'maxMs': round(peak * 1000, 3)
+        } for name, (calls, total, peak) in _statement_stats.items()]
+    return sorted(rows, key=lambda r: r['totalMs'], reverse=True)
+
+
+def get_user_from_token(event: dict) -> int:
+    """Извлекает user_id из JWT токена"""
+    auth_header = event.get('headers', {}).get('authorization') or event.get('headers', {}).get('Authorization')
+
+    if not auth_header:
+        raise ValueError('Authorization header required')
+
+    token = auth_header.replace('Bearer ', '')
+    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+
+    try:
+        payload = jwt.decode(token, secret, algorithms=['HS256'])
+        return payload['user_id']
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+
+def cors_response() -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Analytics-Key',
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def json_response(data: dict, status: int = 200) -> dict:
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(data),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(message: str, status_code: int) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,648 @@
+import json
+import os
+import hmac
+import time
+import base64
+import threading
+import weakref
+import psycopg2
+from psycopg2.errors import InvalidSqlStatementName, DuplicatePreparedStatement
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from datetime import datetime
+import jwt
+
+FEED_PAGE_SIZE = 20
+FEED_PAGE_MAX = 50
+CACHE_TTL_SECONDS = int(os.environ.get('COMMUNITY_CACHE_TTL', '10'))
+CACHE_MAX_ENTRIES = 1000
+FLUSH_INTERVAL_SECONDS = int(os.environ.get('COMMUNITY_FLUSH_INTERVAL', '5'))
+FLUSH_BATCH_SIZE = 5000
+FLUSH_LOCK_KEY = 26001
+
+STATEMENTS = {
+    'community_feed_first': (('varchar', 'integer'), """
+        SELECT p.id, p.category, p.title, p.content, p.likes_count, p.replies_count,
+               p.is_anonymous, p.created_at, u.name
+        FROM community_posts p
+        LEFT JOIN users u ON u.id = p.user_id
+        WHERE p.category = $1
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT $2
+    """),
+    'community_feed_after': (('varchar', 'timestamp', 'integer', 'integer'), """
+        SELECT p.id, p.category, p.title, p.content, p.likes_count, p.replies_count,
+               p.is_anonymous, p.created_at, u.name
+        FROM community_posts p
+        LEFT JOIN users u ON u.id = p.user_id
+        WHERE p.category = $1 AND (p.created_at, p.id) < ($2, $3)
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT $4
+    """),
+    'community_post': (('integer',), """
+        SELECT p.id, p.category, p.title, p.content,
+               p.likes_count + COALESCE(d.likes, 0),
+               p.replies_count + COALESCE(d.replies, 0),
+               p.is_anonymous, p.created_at, u.name
+        FROM community_posts p
+        LEFT JOIN users u ON u.id = p.user_id
+        LEFT JOIN (
+            SELECT SUM(likes_delta) AS likes, SUM(replies_delta) AS replies
+            FROM community_counter_deltas
+            WHERE post_id = $1
+        ) d ON true
+        WHERE p.id = $1
+    """),
+    'community_replies_first': (('integer', 'integer'), """
+        SELECT r.id, r.content, r.likes_count, r.is_anonymous, r.created_at, u.name
+        FROM community_replies r
+        LEFT JOIN users u ON u.id = r.user_id
+        WHERE r.post_id = $1
+        ORDER BY r.created_at, r.id
+        LIMIT $2
+    """),
+    'community_replies_after': (('integer', 'timestamp', 'integer', 'integer'), """
+        SELECT r.id, r.content, r.likes_count, r.is_anonymous, r.created_at, u.name
+        FROM community_replies r
+        LEFT JOIN users u ON u.id = r.user_id
+        WHERE r.post_id = $1 AND (r.created_at, r.id) > ($2, $3)
+        ORDER BY r.created_at, r.id
+        LIMIT $4
+    """),
+    'community_post_insert': (('integer', 'varchar', 'varchar', 'text', 'boolean'), """
+        INSERT INTO community_posts (user_id, category, title, content, is_anonymous)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING id, category, title, content, likes_count, replies_count,
+                  is_anonymous, created_at, (SELECT name FROM users WHERE id = $1)
+    """),
+    'community_post_exists': (('integer',), """
+        SELECT 1 FROM community_posts WHERE id = $1
+    """),
+    'community_reply_insert': (('integer', 'integer', 'text', 'boolean'), """
+        INSERT INTO community_replies (post_id, user_id, content, is_anonymous)
+        VALUES ($1, $2, $3, $4)
+        RETURNING id, content, likes_count, is_anonymous, created_at,
+                  (SELECT name FROM users WHERE id = $2)
+    """),
+    'community_reply_delta': (('integer',), """
+        INSERT INTO community_counter_deltas (post_id, replies_delta)
+        VALUES ($1, 1)
+    """),
+    'community_like': (('integer', 'integer'), """
+        WITH liked AS (
+            INSERT INTO community_post_likes (post_id, user_id)
+            SELECT id, $1 FROM community_posts WHERE id = $2
+            ON CONFLICT DO NOTHING
+            RETURNING post_id
+        )
+        INSERT INTO community_counter_deltas (post_id, likes_delta)
+        SELECT post_id, 1 FROM liked
+        RETURNING post_id
+    """)
+}
+
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_statement_stats = {}
+_stats_lock = threading.Lock()
+
+_cache = {}
+_cache_lock = threading.Lock()
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def handler(event: dict, context) -> dict:
+    """
+    API сообщества:
+    - Лента постов по категории с курсорной пагинацией
+    - Пост с ответами
+    - Создание постов и ответов, лайки
+    - Слив буфера счетчиков по расписанию
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return cors_response()
+
+    try:
+        if method == 'POST':
+            body = json.loads(event.get('body', '{}'))
+            if body.get('action') == 'flush':
+                if not is_flush_authorized(event):
+                    return error_response('Forbidden', 403)
+                return json_response({'updated': drain_counters()})
+
+        user_id = get_user_from_token(event)
+
+        if method == 'GET':
+            params = event.get('queryStringParameters', {}) or {}
+            if params.get('postId'):
+                return get_post(params)
+            return get_feed(params)
+        elif method == 'POST':
+            action = body.get('action', 'create')
+
+            if action == 'create':
+                return create_post(user_id, body)
+            elif action == 'reply':
+                return create_reply(user_id, body)
+            elif action == 'like':
+                return like_post(user_id, body)
+            return error_response(f'Unknown action: {action}', 400)
+        else:
+            return error_response('Method not allowed', 405)
+
+    except ValueError as e:
+        return error_response(str(e), 401)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+def get_feed(params: dict) -> dict:
+    """Лента категории: первая страница из кэша, дальше по курсору (created_at, id)"""
+    category = params.get('category')
+    if not category:
+        return error_response('category is required', 400)
+
+    limit = parse_limit(params.get('limit'))
+    if limit is None:
+        return error_response('Invalid limit', 400)
+
+    cursor = params.get('cursor')
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            return error_response('Invalid cursor', 400)
+    else:
+        cached = cache_get(('feed', category, limit))
+        if cached is not None:
+            return json_response(cached)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        if after:
+            execute_statement(cur, 'community_feed_after', (category, after[0], after[1], limit + 1))
+        else:
+            execute_statement(cur, 'community_feed_first', (category, limit + 1))
+
+        rows = cur.fetchall()
+        posts = [post_from_row(row) for row in rows[:limit]]
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last[7], last[0])
+
+        data = {'posts': posts, 'nextCursor': next_cursor}
+
+        if not cursor:
+            cache_put(('feed', category, limit), data)
+
+        return json_response(data)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_post(params: dict) -> dict:
+    """Пост со счетчиками с учетом еще не слитых инкрементов и страница ответов"""
+    try:
+        post_id = int(params.get('postId'))
+    except (TypeError, ValueError):
+        return error_response('Invalid postId', 400)
+
+    limit = parse_limit(params.get('limit'))
+    if limit is None:
+        return error_response('Invalid limit', 400)
+
+    cursor = params.get('cursor')
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            return error_response('Invalid cursor', 400)
+    else:
+        cached = cache_get(('post', post_id, limit))
+        if cached is not None:
+            return json_response(cached)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'community_post', (post_id,))
+
+        row = cur.fetchone()
+        if not row:
+            return error_response('Post not found', 404)
+
+        if after:
+            execute_statement(cur, 'community_replies_after', (post_id, after[0], after[1], limit + 1))
+        else:
+            execute_statement(cur, 'community_replies_first', (post_id, limit + 1))
+
+        reply_rows = cur.fetchall()
+        replies = [reply_from_row(r) for r in reply_rows[:limit]]
+
+        next_cursor = None
+        if len(reply_rows) > limit:
+            last = reply_rows[limit - 1]
+            next_cursor = encode_cursor(last[4], last[0])
+
+        data = {
+            'post': post_from_row(row),
+            'replies': replies,
+            'nextCursor': next_cursor
+        }
+
+        if not cursor:
+            cache_put(('post', post_id, limit), data)
+
+        return json_response(data)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def create_post(user_id: int, body: dict) -> dict:
+    """Создает пост в категории"""
+    category = body.get('category')
+    title = body.get('title')
+    content = body.get('content')
+    is_anonymous = bool(body.get('isAnonymous', False))
+
+    if not category or not title or not content:
+        return error_response('category, title and content are required', 400)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'community_post_insert', (user_id, category, title, content, is_anonymous))
+
+        row = cur.fetchone()
+        conn.commit()
+
+        cache_invalidate('feed', category)
+
+        return json_response(post_from_row(row), 201)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def create_reply(user_id: int, body: dict) -> dict:
+    """Добавляет ответ; счетчик ответов поста увеличивается через буфер инкрементов"""
+    post_id = body.get('postId')
+    content = body.get('content')
+    is_anonymous = bool(body.get('isAnonymous', False))
+
+    if not post_id or not content:
+        return error_response('postId and content are required', 400)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'community_post_exists', (post_id,))
+        if not cur.fetchone():
+            return error_response('Post not found', 404)
+
+        execute_statement(cur, 'community_reply_insert', (post_id, user_id, content, is_anonymous))
+
+        row = cur.fetchone()
+
+        execute_statement(cur, 'community_reply_delta', (post_id,))
+
+        conn.commit()
+
+        maybe_flush_counters(conn)
+        cache_invalidate('post', int(post_id))
+
+        return json_response(reply_from_row(row), 201)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def like_post(user_id: int, body: dict) -> dict:
+    """
+    Лайк фиксируется в community_post_likes (один на пользователя), и только
+    новый лайк пишется в буфер инкрементов без блокировки строки поста
+    """
+    post_id = body.get('postId')
+
+    if not post_id:
+        return error_response('postId is required', 400)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'community_like', (user_id, post_id))
+
+        if cur.fetchone():
+            conn.commit()
+            maybe_flush_counters(conn)
+            return json_response({'postId': int(post_id), 'liked': True}, 201)
+
+        execute_statement(cur, 'community_post_exists', (post_id,))
+        found = cur.fetchone()
+        conn.rollback()
+
+        if not found:
+            return error_response('Post not found', 404)
+        return json_response({'postId': int(post_id), 'liked': True})
+    finally:
+        cur.close()
+        conn.close()
+
+
+def maybe_flush_counters(conn) -> int:
+    """Сливает накопленные инкременты не чаще раза в FLUSH_INTERVAL_SECONDS"""
+    global _last_flush
+
+    now = time.monotonic()
+    with _flush_lock:
+        if now - _last_flush < FLUSH_INTERVAL_SECONDS:
+            return 0
+        _last_flush = now
+
+    return flush_counters(conn)
+
+
+def drain_counters() -> int:
+    """
+    Сливает весь буфер инкрементов. Вызывается по расписанию: без него
+    последние лайки и ответы остаются в буфере, пока не придет следующая
+    запись, и лента показывает заниженные счетчики.
+    """
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+
+    try:
+        total = 0
+        while True:
+            updated = flush_counters(conn)
+            if not updated:
+                return total
+            total += updated
+    finally:
+        conn.close()
+
+
+def flush_counters(conn) -> int:
+    """
+    Переносит инкременты из community_counter_deltas в community_posts одной
+    командой UPDATE на пачку: каждая строка поста блокируется один раз за пачку,
+    а не на каждый лайк. Параллельные сливы исключает advisory-блокировка.
+    """
+    cur = conn.cursor()
+
+    try:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (FLUSH_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return 0
+
+        cur.execute("""
+            WITH drained AS (
+                DELETE FROM community_counter_deltas
+                WHERE id IN (
+                    SELECT id FROM community_counter_deltas
+                    ORDER BY id
+                    LIMIT %s
+                )
+                RETURNING post_id, likes_delta, replies_delta
+            ), totals AS (
+                SELECT post_id, SUM(likes_delta) AS likes, SUM(replies_delta) AS replies
+                FROM drained
+                GROUP BY post_id
+            )
+            UPDATE community_posts p
+            SET likes_count = p.likes_count + t.likes,
+                replies_count = p.replies_count + t.replies
+            FROM totals t
+            WHERE p.id = t.post_id
+        """, (FLUSH_BATCH_SIZE,))
+
+        updated = cur.rowcount
+        conn.commit()
+        return updated
+    finally:
+        cur.close()
+
+
+def post_from_row(row: tuple) -> dict:
+    return {
+        'id': row[0],
+        'category': row[1],
+        'title': row[2],
+        'content': row[3],
+        'likesCount': row[4],
+        'repliesCount': row[5],
+        'isAnonymous': row[6],
+        'createdAt': row[7].isoformat() if row[7] else None,
+        'author': None if row[6] else row[8]
+    }
+
+
+def reply_from_row(row: tuple) -> dict:
+    return {
+        'id': row[0],
+        'content': row[1],
+        'likesCount': row[2],
+        'isAnonymous': row[3],
+        'createdAt': row[4].isoformat() if row[4] else None,
+        'author': None if row[3] else row[5]
+    }
+
+
+def parse_limit(value) -> int:
+    """Размер страницы; None при некорректном значении"""
+    if value is None:
+        return FEED_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        return None
+    if limit < 1:
+        return None
+    return min(limit, FEED_PAGE_MAX)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Разбирает курсор (created_at, id); None при некорректном значении"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def cache_get(key: tuple):
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def cache_put(key: tuple, data: dict) -> None:
+    """Кэш общий для потоков сервера, поэтому изменения идут под _cache_lock"""
+    now = time.monotonic()
+    with _cache_lock:
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            for stale in [k for k, v in _cache.items() if v[0] <= now]:
+                del _cache[stale]
+            if len(_cache) >= CACHE_MAX_ENTRIES:
+                _cache.clear()
+        _cache[key] = (now + CACHE_TTL_SECONDS, data)
+
+
+def cache_invalidate(kind: str, ident) -> None:
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == kind and k[1] == ident]:
+            del _cache[key]
+
+
+def execute_statement(cur, name: str, params: tuple) -> None:
+    """
+    Выполняет запрос из STATEMENTS как подготовленный на сервере.
+    При первом использовании на соединении PREPARE уходит отдельным
+    обращением, и имя отмечается сразу после него: подготовленный запрос
+    остается на сервере, даже если EXECUTE или вся транзакция затем упадет.
+    Если сервер потерял подготовленный запрос (соединение пересоздано или
+    сброшено пулером), он готовится заново; если запрос уже подготовлен,
+    хотя не отмечен, отметка восстанавливается. Повтор возможен только вне
+    транзакции, иначе ошибка пробрасывается, а следующий вызов уже пойдет
+    верным путем.
+    """
+    conn = cur.connection
+    with _prepared_lock:
+        state = _prepared.get(conn)
+        if state is None or state[0] != conn.info.backend_pid:
+            state = (conn.info.backend_pid, set())
+            _prepared[conn] = state
+
+    idle = conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    start = time.perf_counter()
+
+    try:
+        run_prepared(cur, name, params, state[1])
+    except InvalidSqlStatementName:
+        state[1].discard(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+    except DuplicatePreparedStatement:
+        state[1].add(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+
+    record_statement(name, time.perf_counter() - start)
+
+
+def run_prepared(cur, name: str, params: tuple, prepared: set) -> None:
+    """PREPARE с явными типами параметров: без них $n в выражениях выводятся неверно"""
+    types, sql = STATEMENTS[name]
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}")
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def record_statement(name: str, elapsed: float) -> None:
+    with _stats_lock:
+        stats = _statement_stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def statement_stats() -> list:
+    """Число вызовов и время по каждому запросу из STATEMENTS, самые дорогие первыми"""
+    with _stats_lock:
+        rows = [{
+            'statement': name,
+            'calls': calls,
+            'totalMs': round(total * 1000, 3),
+            'avgMs': round(total * 1000 / calls, 3),
+            'maxMs': round(peak * 1000, 3)
+        } for name, (calls, total, peak) in _statement_stats.items()]
+    return sorted(rows, key=lambda r: r['totalMs'], reverse=True)
+
+
+def is_flush_authorized(event: dict) -> bool:
+    """Слив по расписанию запускается с ключом COMMUNITY_FLUSH_KEY"""
+    expected = os.environ.get('COMMUNITY_FLUSH_KEY')
+    headers = event.get('headers', {}) or {}
+    provided = headers.get('x-community-key') or headers.get('X-Community-Key') or ''
+    return bool(expected) and hmac.compare_digest(provided, expected)
+
+
+def get_user_from_token(event: dict) -> int:
+    """Извлекает user_id из JWT токена"""
+    auth_header = event.get('headers', {}).get('authorization') or event.get('headers', {}).get('Authorization')
+
+    if not auth_header:
+        raise ValueError('Authorization header required')
+
+    token = auth_header.replace('Bearer ', '')
+    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+
+    try:
+        payload = jwt.decode(token, secret, algorithms=['HS256'])
+        return payload['user_id']
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+
+def cors_response() -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Community-Key',
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def json_response(data: dict, status: int = 200) -> dict:
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(data),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(message: str, status_code: int) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
@@ -1,9 +1,57 @@
 import json
 import os
+import time
+import threading
+import weakref
+import gzip
+import base64
 import psycopg2
+from psycopg2.errors import InvalidSqlStatementName, DuplicatePreparedStatement
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from datetime import datetime, timedelta
 import jwt
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+
+STATEMENTS = {
+    'cycles_list': (('integer', 'integer'), """
+        SELECT id, start_date, end_date, cycle_length, period_length, notes, created_at
+        FROM cycles
+        WHERE user_id = $1
+        ORDER BY start_date DESC
+        LIMIT $2
+    """),
+    'cycles_profile_averages': (('integer',), """
+        SELECT average_cycle_length, average_period_length
+        FROM user_profiles
+        WHERE user_id = $1
+    """),
+    'cycles_previous_start': (('integer', 'date'), """
+        SELECT start_date FROM cycles
+        WHERE user_id = $1 AND start_date < $2
+        ORDER BY start_date DESC
+        LIMIT 1
+    """),
+    'cycles_insert': (('integer', 'date', 'date', 'integer', 'integer', 'text'), """
+        INSERT INTO cycles (user_id, start_date, end_date, cycle_length, period_length, notes)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING id, start_date, end_date, cycle_length, period_length, notes, created_at
+    """),
+    'cycles_start_by_id': (('integer', 'integer'), """
+        SELECT start_date FROM cycles WHERE id = $1 AND user_id = $2
+    """)
+}
+
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_statement_stats = {}
+_stats_lock = threading.Lock()
+
 def handler(event: dict, context) -> dict:
     """
     API для управления менструальными циклами:
@@ -43,13 +91,7 @@ def get_cycles(user_id: int, event: dict) -> dict:
         params = event.get('queryStringParameters', {}) or {}
         limit = int(params.get('limit', 12))
         
-        cur.execute("""
-            SELECT id, start_date, end_date, cycle_length, period_length, notes, created_at
-            FROM cycles
-            WHERE user_id = %s
-            ORDER BY start_date DESC
-            LIMIT %s
-        """, (user_id, limit))
+        execute_statement(cur, 'cycles_list', (user_id, limit))
         
         cycles = []
         for row in cur.fetchall():
@@ -63,11 +105,7 @@ def get_cycles(user_id: int, event: dict) -> dict:
                 'createdAt': row[6].isoformat() if row[6] else None
             })
         
-        cur.execute("""
-            SELECT average_cycle_length, average_period_length
-            FROM user_profiles
-            WHERE user_id = %s
-        """, (user_id,))
+        execute_statement(cur, 'cycles_profile_averages', (user_id,))
         
         profile = cur.fetchone()
         avg_cycle = profile[0] if profile else 28
@@ -75,18 +113,10 @@ def get_cycles(user_id: int, event: dict) -> dict:
         
         predictions = calculate_predictions(cycles, avg_cycle, avg_period)
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'cycles': cycles,
-                'predictions': predictions
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response({
+            'cycles': to_columnar(cycles) if params.get('layout') == 'columnar' else cycles,
+            'predictions': predictions
+        }, event=event)
     finally:
         cur.close()
         conn.close()
@@ -111,26 +141,17 @@ def create_cycle(user_id: int, event: dict) -> dict:
         period_length = None
         
         if end_date:
-            start = datetime.fromisoformat(start_date)
-            end = datetime.fromisoformat(end_date)
+            start = datetime.fromisoformat(start_date).date()
+            end = datetime.fromisoformat(end_date).date()
             period_length = (end - start).days + 1
             
-            cur.execute("""
-                SELECT start_date FROM cycles
-                WHERE user_id = %s AND start_date < %s
-                ORDER BY start_date DESC
-                LIMIT 1
-            """, (user_id, start_date))
+            execute_statement(cur, 'cycles_previous_start', (user_id, start_date))
             
             prev = cur.fetchone()
             if prev:
                 cycle_length = (start - prev[0]).days
         
-        cur.execute("""
-            INSERT INTO cycles (user_id, start_date, end_date, cycle_length, period_length, notes)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id, start_date, end_date, cycle_length, period_length, notes, created_at
-        """, (user_id, start_date, end_date, cycle_length, period_length, notes))
+        execute_statement(cur, 'cycles_insert', (user_id, start_date, end_date, cycle_length, period_length, notes))
         
         row = cur.fetchone()
         conn.commit()
@@ -178,7 +199,7 @@ def update_cycle(user_id: int, event: dict) -> dict:
         params = []
         
         if end_date is not None:
-            cur.execute("SELECT start_date FROM cycles WHERE id = %s AND user_id = %s", (cycle_id, user_id))
+            execute_statement(cur, 'cycles_start_by_id', (cycle_id, user_id))
             row = cur.fetchone()
             
             if row:
@@ -280,6 +301,76 @@ def calculate_predictions(cycles: list, avg_cycle: int, avg_period: int) -> dict
     }
 
 
+def execute_statement(cur, name: str, params: tuple) -> None:
+    """
+    Выполняет запрос из STATEMENTS как подготовленный на сервере.
+    При первом использовании на соединении PREPARE уходит отдельным
+    обращением, и имя отмечается сразу после него: подготовленный запрос
+    остается на сервере, даже если EXECUTE или вся транзакция затем упадет.
+    Если сервер потерял подготовленный запрос (соединение пересоздано или
+    сброшено пулером), он готовится заново; если запрос уже подготовлен,
+    хотя не отмечен, отметка восстанавливается. Повтор возможен только вне
+    транзакции, иначе ошибка пробрасывается, а следующий вызов уже пойдет
+    верным путем.
+    """
+    conn = cur.connection
+    with _prepared_lock:
+        state = _prepared.get(conn)
+        if state is None or state[0] != conn.info.backend_pid:
+            state = (conn.info.backend_pid, set())
+            _prepared[conn] = state
+
+    idle = conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    start = time.perf_counter()
+
+    try:
+        run_prepared(cur, name, params, state[1])
+    except InvalidSqlStatementName:
+        state[1].discard(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+    except DuplicatePreparedStatement:
+        state[1].add(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+
+    record_statement(name, time.perf_counter() - start)
+
+
+def run_prepared(cur, name: str, params: tuple, prepared: set) -> None:
+    """PREPARE с явными типами параметров: без них $n в выражениях выводятся неверно"""
+    types, sql = STATEMENTS[name]
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}")
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def record_statement(name: str, elapsed: float) -> None:
+    with _stats_lock:
+        stats = _statement_stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def statement_stats() -> list:
+    """Число вызовов и время по каждому запросу из STATEMENTS, самые дорогие первыми"""
+    with _stats_lock:
+        rows = [{
+            'statement': name,
+            'calls': calls,
+            'totalMs': round(total * 1000, 3),
+            'avgMs': round(total * 1000 / calls, 3),
+            'maxMs': round(peak * 1000, 3)
+        } for name, (calls, total, peak) in _statement_stats.items()]
+    return sorted(rows, key=lambda r: r['totalMs'], reverse=True)
+
+
 def get_user_from_token(event: dict) -> int:
     """Извлекает user_id из JWT токена"""
     auth_header = event.get('headers', {}).get('authorization') or event.get('headers', {}).get('Authorization')
@@ -314,6 +405,73 @@ def cors_response() -> dict:
     }
 
 
+def json_response(data: dict, status: int = 200, event: dict = None) -> dict:
+    """JSON-ответ; крупные тела сжимаются по Accept-Encoding и отдаются в base64"""
+    body = json.dumps(data)
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    encoding = negotiate_encoding(event) if event and len(body) >= COMPRESS_MIN_BYTES else None
+    if not encoding:
+        return {
+            'statusCode': status,
+            'headers': headers,
+            'body': body,
+            'isBase64Encoded': False
+        }
+
+    if encoding == 'br':
+        payload = brotli.compress(body.encode('utf-8'), quality=5)
+    else:
+        payload = gzip.compress(body.encode('utf-8'), compresslevel=6)
+
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = 'Accept-Encoding'
+
+    return {
+        'statusCode': status,
+        'headers': headers,
+        'body': base64.b64encode(payload).decode(),
+        'isBase64Encoded': True
+    }
+
+
+def negotiate_encoding(event: dict) -> str:
+    """Выбирает br или gzip из Accept-Encoding с учетом q-весов"""
+    headers = event.get('headers', {}) or {}
+    accept = headers.get('accept-encoding') or headers.get('Accept-Encoding') or ''
+
+    weights = {}
+    for part in accept.split(','):
+        token, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[token.strip().lower()] = q
+
+    candidates = ['br', 'gzip'] if brotli else ['gzip']
+    best = None
+    for name in candidates:
+        q = weights.get(name, weights.get('*', 0.0))
+        if q > 0 and (best is None or q > weights.get(best, weights.get('*', 0.0))):
+            best = name
+    return best
+
+
+def to_columnar(rows: list) -> dict:
+    """Список однотипных объектов в виде {'columns': [...], 'rows': [[...], ...]}"""
+    columns = list(rows[0].keys()) if rows else []
+    return {
+        'columns': columns,
+        'rows': [[row.get(c) for c in columns] for row in rows]
+    }
+
+
 def error_response(message: str, status_code: int) -> dict:
     """Ответ с ошибкой"""
     return {
@@ -0,0 +1,484 @@
+import json
+import os
+import time
+import threading
+import weakref
+import psycopg2
+from psycopg2.errors import InvalidSqlStatementName, DuplicatePreparedStatement
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from datetime import datetime, date, timedelta
+import jwt
+
+DEFAULT_WINDOW_DAYS = 30
+MAX_WINDOW_DAYS = 366 * 5
+DEFAULT_TIMEZONE = 'Europe/Moscow'
+
+DOSES_PER_DAY = {
+    'daily': 1,
+    'once_daily': 1,
+    'twice_daily': 2,
+    'three_times_daily': 3,
+    'four_times_daily': 4
+}
+
+INTERVAL_DAYS = {
+    'every_other_day': 2,
+    'weekly': 7,
+    'monthly': 30
+}
+
+STATEMENTS = {
+    'medications_window': (('date', 'date', 'integer'), """
+        SELECT m.id, m.name, m.type, m.dosage, m.frequency, m.start_date, m.end_date,
+               m.reminder_time, m.notes, m.active,
+               COALESCE(SUM(a.taken_count), 0), COALESCE(SUM(a.skipped_count), 0)
+        FROM medications m
+        LEFT JOIN medication_adherence_daily a
+            ON a.medication_id = m.id AND a.log_date BETWEEN $1 AND $2
+        WHERE m.user_id = $3
+        GROUP BY m.id
+        ORDER BY m.active DESC, m.name
+    """),
+    'medications_chart': (('date', 'date', 'integer', 'integer'), """
+        SELECT m.id, m.name, m.type, m.dosage, m.frequency, m.start_date, m.end_date,
+               m.reminder_time, m.notes, m.active,
+               a.log_date, a.taken_count, a.skipped_count
+        FROM medications m
+        LEFT JOIN medication_adherence_daily a
+            ON a.medication_id = m.id AND a.log_date BETWEEN $1 AND $2
+        WHERE m.id = $3 AND m.user_id = $4
+        ORDER BY a.log_date
+    """),
+    'medications_insert': (('integer', 'varchar', 'varchar', 'varchar', 'varchar', 'date', 'date', 'time', 'text'), """
+        INSERT INTO medications
+        (user_id, name, type, dosage, frequency, start_date, end_date, reminder_time, notes)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+        RETURNING id, name, type, dosage, frequency, start_date, end_date, reminder_time, notes, active
+    """),
+    'medications_log_insert': (('timestamptz', 'timestamp', 'boolean', 'text', 'integer', 'integer', 'varchar'), """
+        INSERT INTO medication_logs (medication_id, taken_at, skipped, notes)
+        SELECT m.id, COALESCE($1 AT TIME ZONE l.tz, $2, NOW() AT TIME ZONE l.tz), $3, $4
+        FROM medications m
+        CROSS JOIN LATERAL (
+            SELECT COALESCE(
+                (SELECT timezone FROM user_profiles WHERE user_id = m.user_id LIMIT 1), $7
+            ) AS tz
+        ) l
+        WHERE m.id = $5 AND m.user_id = $6
+        RETURNING id, medication_id, taken_at, skipped, notes
+    """),
+    'medications_adherence_upsert': (('integer', 'date', 'integer', 'integer'), """
+        INSERT INTO medication_adherence_daily (medication_id, log_date, taken_count, skipped_count)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (medication_id, log_date)
+        DO UPDATE SET
+            taken_count = medication_adherence_daily.taken_count + EXCLUDED.taken_count,
+            skipped_count = medication_adherence_daily.skipped_count + EXCLUDED.skipped_count,
+            updated_at = NOW()
+    """)
+}
+
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_statement_stats = {}
+_stats_lock = threading.Lock()
+
+
+def handler(event: dict, context) -> dict:
+    """
+    API для лекарств и контрацепции:
+    - Список лекарств с соблюдением режима за окно
+    - График соблюдения по дням для одного лекарства
+    - Добавление лекарства и отметка приема/пропуска
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return cors_response()
+
+    try:
+        user_id = get_user_from_token(event)
+
+        if method == 'GET':
+            params = event.get('queryStringParameters', {}) or {}
+            if params.get('medicationId'):
+                return get_adherence_chart(user_id, params)
+            return get_medications(user_id, params)
+        elif method == 'POST':
+            body = json.loads(event.get('body', '{}'))
+            action = body.get('action', 'create')
+
+            if action == 'create':
+                return create_medication(user_id, body)
+            elif action == 'log':
+                return log_intake(user_id, body)
+            return error_response(f'Unknown action: {action}', 400)
+        else:
+            return error_response('Method not allowed', 405)
+
+    except ValueError as e:
+        return error_response(str(e), 401)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+def get_medications(user_id: int, params: dict) -> dict:
+    """Список лекарств с соблюдением режима за окно из суточной сводки"""
+    window = parse_window(params)
+    if window is None:
+        return error_response('Invalid window', 400)
+    window_from, window_to = window
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'medications_window', (window_from, window_to, user_id))
+
+        medications = []
+        for row in cur.fetchall():
+            medication = medication_from_row(row)
+            expected = expected_doses(row[4], row[5], row[6], window_from, window_to)
+            medication['adherence'] = adherence_summary(expected, row[10], row[11])
+            medications.append(medication)
+
+        return json_response({
+            'from': window_from.isoformat(),
+            'to': window_to.isoformat(),
+            'medications': medications
+        })
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_adherence_chart(user_id: int, params: dict) -> dict:
+    """График по дням: один диапазонный запрос по первичному ключу сводки"""
+    try:
+        medication_id = int(params.get('medicationId'))
+    except (TypeError, ValueError):
+        return error_response('Invalid medicationId', 400)
+
+    window = parse_window(params)
+    if window is None:
+        return error_response('Invalid window', 400)
+    window_from, window_to = window
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'medications_chart', (window_from, window_to, medication_id, user_id))
+
+        rows = cur.fetchall()
+        if not rows:
+            return error_response('Medication not found', 404)
+
+        medication = medication_from_row(rows[0])
+        frequency, start_date, end_date = rows[0][4], rows[0][5], rows[0][6]
+        logged = {r[10]: (r[11], r[12]) for r in rows if r[10]}
+
+        days = []
+        total_taken = 0
+        total_skipped = 0
+        day = window_from
+        while day <= window_to:
+            taken, skipped = logged.get(day, (0, 0))
+            total_taken += taken
+            total_skipped += skipped
+            days.append({
+                'date': day.isoformat(),
+                'expected': expected_doses(frequency, start_date, end_date, day, day),
+                'taken': taken,
+                'skipped': skipped
+            })
+            day += timedelta(days=1)
+
+        expected = expected_doses(frequency, start_date, end_date, window_from, window_to)
+        medication['adherence'] = adherence_summary(expected, total_taken, total_skipped)
+
+        return json_response({
+            'medication': medication,
+            'days': days
+        })
+    finally:
+        cur.close()
+        conn.close()
+
+
+def create_medication(user_id: int, body: dict) -> dict:
+    """Добавляет лекарство"""
+    name = body.get('name')
+    if not name:
+        return error_response('name is required', 400)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'medications_insert', (
+            user_id, name, body.get('type'), body.get('dosage'), body.get('frequency'),
+            body.get('startDate') or date.today().isoformat(), body.get('endDate'),
+            body.get('reminderTime'), body.get('notes', '')
+        ))
+
+        row = cur.fetchone()
+        conn.commit()
+
+        return json_response(medication_from_row(row), 201)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def log_intake(user_id: int, body: dict) -> dict:
+    """
+    Записывает прием или пропуск и в той же транзакции обновляет суточную сводку.
+    taken_at хранится в локальном времени пользователя (user_profiles.timezone),
+    как и в напоминаниях, поэтому день сводки совпадает с его календарем:
+    время со смещением переводится в этот пояс, время без смещения считается
+    уже локальным, а без takenAt берется текущее локальное время.
+    """
+    medication_id = body.get('medicationId')
+    if not medication_id:
+        return error_response('medicationId is required', 400)
+
+    taken_at = None
+    if body.get('takenAt'):
+        try:
+            taken_at = datetime.fromisoformat(body['takenAt'].replace('Z', '+00:00'))
+        except ValueError:
+            return error_response('takenAt must be an ISO datetime', 400)
+    aware = taken_at if taken_at and taken_at.tzinfo else None
+    local = taken_at if taken_at and not taken_at.tzinfo else None
+    skipped = bool(body.get('skipped', False))
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'medications_log_insert', (
+            aware, local, skipped, body.get('notes', ''), medication_id, user_id, DEFAULT_TIMEZONE
+        ))
+
+        row = cur.fetchone()
+        if not row:
+            conn.rollback()
+            return error_response('Medication not found', 404)
+
+        execute_statement(cur, 'medications_adherence_upsert', (
+            row[1], row[2].date(), 0 if skipped else 1, 1 if skipped else 0
+        ))
+
+        conn.commit()
+
+        return json_response({
+            'id': row[0],
+            'medicationId': row[1],
+            'takenAt': row[2].isoformat(),
+            'skipped': row[3],
+            'notes': row[4]
+        }, 201)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def expected_doses(frequency: str, start_date: date, end_date: date, window_from: date, window_to: date) -> int:
+    """
+    Ожидаемое число доз в окне по частоте приема и датам курса.
+    None для приема по необходимости и нераспознанной частоты.
+    """
+    key = (frequency or '').strip().lower()
+    first = max(window_from, start_date) if start_date else window_from
+    last = min(window_to, date.today())
+    if end_date:
+        last = min(last, end_date)
+
+    if key in DOSES_PER_DAY:
+        if last < first:
+            return 0
+        return ((last - first).days + 1) * DOSES_PER_DAY[key]
+
+    if key in INTERVAL_DAYS:
+        if last < first:
+            return 0
+        interval = INTERVAL_DAYS[key]
+        anchor = start_date or first
+        first_dose = first + timedelta(days=(anchor - first).days % interval)
+        if first_dose > last:
+            return 0
+        return (last - first_dose).days // interval + 1
+
+    return None
+
+
+def adherence_summary(expected: int, taken: int, skipped: int) -> dict:
+    return {
+        'expected': expected,
+        'taken': taken,
+        'skipped': skipped,
+        'rate': round(min(taken / expected, 1.0), 3) if expected else None
+    }
+
+
+def parse_window(params: dict) -> tuple:
+    """Окно from/to или последние days дней; None при некорректных параметрах"""
+    try:
+        if params.get('from'):
+            window_from = date.fromisoformat(params['from'])
+            window_to = date.fromisoformat(params['to']) if params.get('to') else date.today()
+        else:
+            days = int(params.get('days', DEFAULT_WINDOW_DAYS))
+            if days < 1:
+                return None
+            window_to = date.fromisoformat(params['to']) if params.get('to') else date.today()
+            window_from = window_to - timedelta(days=days - 1)
+    except ValueError:
+        return None
+
+    if window_to < window_from or (window_to - window_from).days >= MAX_WINDOW_DAYS:
+        return None
+    return window_from, window_to
+
+
+def medication_from_row(row: tuple) -> dict:
+    return {
+        'id': row[0],
+        'name': row[1],
+        'type': row[2],
+        'dosage': row[3],
+        'frequency': row[4],
+        'startDate': row[5].isoformat() if row[5] else None,
+        'endDate': row[6].isoformat() if row[6] else None,
+        'reminderTime': row[7].strftime('%H:%M') if row[7] else None,
+        'notes': row[8],
+        'active': row[9]
+    }
+
+
+def execute_statement(cur, name: str, params: tuple) -> None:
+    """
+    Выполняет запрос из STATEMENTS как подготовленный на сервере.
+    При первом использовании на соединении PREPARE уходит отдельным
+    обращением, и имя отмечается сразу после него: подготовленный запрос
+    остается на сервере, даже если EXECUTE или вся транзакция затем упадет.
+    Если сервер потерял подготовленный запрос (соединение пересоздано или
+    сброшено пулером), он готовится заново; если запрос уже подготовлен,
+    хотя не отмечен, отметка восстанавливается. Повтор возможен только вне
+    транзакции, иначе ошибка пробрасывается, а следующий вызов уже пойдет
+    верным путем.
+    """
+    conn = cur.connection
+    with _prepared_lock:
+        state = _prepared.get(conn)
+        if state is None or state[0] != conn.info.backend_pid:
+            state = (conn.info.backend_pid, set())
+            _prepared[conn] = state
+
+    idle = conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    start = time.perf_counter()
+
+    try:
+        run_prepared(cur, name, params, state[1])
+    except InvalidSqlStatementName:
+        state[1].discard(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+    except DuplicatePreparedStatement:
+        state[1].add(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+
+    record_statement(name, time.perf_counter() - start)
+
+
+def run_prepared(cur, name: str, params: tuple, prepared: set) -> None:
+    """PREPARE с явными типами параметров: без них $n в выражениях выводятся неверно"""
+    types, sql = STATEMENTS[name]
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}")
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def record_statement(name: str, elapsed: float) -> None:
+    with _stats_lock:
+        stats = _statement_stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def statement_stats() -> list:
+    """Число вызовов и время по каждому запросу из STATEMENTS, самые дорогие первыми"""
+    with _stats_lock:
+        rows = [{
+            'statement': name,
+            'calls': calls,
+            'totalMs': round(total * 1000, 3),
+            'avgMs': round(total * 1000 / calls, 3),
+            'maxMs': round(peak * 1000, 3)
+        } for name, (calls, total, peak) in _statement_stats.items()]
+    return sorted(rows, key=lambda r: r['totalMs'], reverse=True)
+
+
+def get_user_from_token(event: dict) -> int:
+    """Извлекает user_id из JWT токена"""
+    auth_header = event.get('headers', {}).get('authorization') or event.get('headers', {}).get('Authorization')
+
+    if not auth_header:
+        raise ValueError('Authorization header required')
+
+    token = auth_header.replace('Bearer ', '')
+    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+
+    try:
+        payload = jwt.decode(token, secret, algorithms=['HS256'])
+        return payload['user_id']
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+
+def cors_response() -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def json_response(data: dict, status: int = 200) -> dict:
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(data),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(message: str, status_code: int) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
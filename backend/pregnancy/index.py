@@ -0,0 +1,371 @@
+import json
+import os
+import time
+import threading
+import weakref
+import psycopg2
+from psycopg2.errors import InvalidSqlStatementName, DuplicatePreparedStatement
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from datetime import date, timedelta
+import jwt
+
+PREGNANCY_DAYS = 280
+MAX_WEEK = 42
+
+STATEMENTS = {
+    'pregnancy_timeline': (('integer', 'integer'), """
+        SELECT p.id, p.conception_date, p.due_date, p.status, p.notes, p.created_at,
+               e.id, e.event_date, e.event_type, e.title, e.description
+        FROM (
+            SELECT id, conception_date, due_date, status, notes, created_at
+            FROM pregnancies
+            WHERE user_id = $1 AND ($2 IS NULL OR id = $2)
+            ORDER BY created_at DESC
+            LIMIT 1
+        ) p
+        LEFT JOIN pregnancy_events e ON e.pregnancy_id = p.id
+        ORDER BY e.event_date, e.id
+    """),
+    'pregnancy_insert': (('integer', 'date', 'date', 'varchar', 'text'), """
+        INSERT INTO pregnancies (user_id, conception_date, due_date, status, notes)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING id, conception_date, due_date, status, notes, created_at
+    """),
+    'pregnancy_event_insert': (('date', 'varchar', 'varchar', 'text', 'integer', 'integer'), """
+        INSERT INTO pregnancy_events (pregnancy_id, event_date, event_type, title, description)
+        SELECT id, $1, $2, $3, $4 FROM pregnancies WHERE id = $5 AND user_id = $6
+        RETURNING id, event_date, event_type, title, description
+    """)
+}
+
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_statement_stats = {}
+_stats_lock = threading.Lock()
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weeks.json'), encoding='utf-8') as f:
+    WEEKS = {w['week']: w for w in json.load(f)}
+
+
+def handler(event: dict, context) -> dict:
+    """
+    API для отслеживания беременности:
+    - Текущая неделя и триместр по датам зачатия/родов
+    - Календарь по неделям вместе с событиями
+    - Создание беременности и событий (визиты, анализы, УЗИ)
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return cors_response()
+
+    try:
+        user_id = get_user_from_token(event)
+
+        if method == 'GET':
+            return get_timeline(user_id, event)
+        elif method == 'POST':
+            body = json.loads(event.get('body', '{}'))
+            action = body.get('action', 'create')
+
+            if action == 'create':
+                return create_pregnancy(user_id, body)
+            elif action == 'event':
+                return create_event(user_id, body)
+            return error_response(f'Unknown action: {action}', 400)
+        else:
+            return error_response('Method not allowed', 405)
+
+    except ValueError as e:
+        return error_response(str(e), 401)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+def get_timeline(user_id: int, event: dict) -> dict:
+    """Беременность и все ее события одним запросом, неделя считается на лету"""
+    params = event.get('queryStringParameters', {}) or {}
+    pregnancy_id = params.get('pregnancyId')
+    if pregnancy_id is not None and not pregnancy_id.isdigit():
+        return error_response('Invalid pregnancyId', 400)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'pregnancy_timeline', (user_id, pregnancy_id))
+
+        rows = cur.fetchall()
+        if not rows:
+            return error_response('Pregnancy not found', 404)
+
+        head = rows[0]
+        events = [event_from_row(r[6:]) for r in rows if r[6] is not None]
+        start = pregnancy_start(head[1], head[2])
+
+        due_date = head[2] or (start + timedelta(days=PREGNANCY_DAYS) if start else None)
+
+        pregnancy = {
+            'id': head[0],
+            'conceptionDate': head[1].isoformat() if head[1] else None,
+            'dueDate': due_date.isoformat() if due_date else None,
+            'status': head[3],
+            'notes': head[4],
+            'createdAt': head[5].isoformat() if head[5] else None
+        }
+
+        if not start:
+            pregnancy.update({'currentWeek': None, 'currentDay': None, 'trimester': None})
+            return json_response({'pregnancy': pregnancy, 'timeline': [], 'events': events})
+
+        today = date.today()
+        elapsed = (today - start).days
+        current_week = week_of(start, today)
+        pregnancy.update({
+            'currentWeek': current_week,
+            'currentDay': elapsed % 7 + 1 if elapsed >= 0 else None,
+            'trimester': trimester(current_week),
+            'daysUntilDue': (due_date - today).days
+        })
+
+        by_week = {}
+        for e in events:
+            by_week.setdefault(week_of(start, date.fromisoformat(e['date'])), []).append(e)
+
+        timeline = []
+        for week in range(1, MAX_WEEK + 1):
+            content = WEEKS.get(week, {})
+            week_start = start + timedelta(weeks=week - 1)
+            timeline.append({
+                'week': week,
+                'trimester': trimester(week),
+                'startDate': week_start.isoformat(),
+                'endDate': (week_start + timedelta(days=6)).isoformat(),
+                'size': content.get('size'),
+                'development': content.get('development'),
+                'isCurrent': week == current_week,
+                'events': by_week.get(week, [])
+            })
+
+        return json_response({'pregnancy': pregnancy, 'timeline': timeline})
+    finally:
+        cur.close()
+        conn.close()
+
+
+def create_pregnancy(user_id: int, body: dict) -> dict:
+    """Создает беременность; current_week не хранится, он считается при чтении"""
+    conception_date = body.get('conceptionDate')
+    due_date = body.get('dueDate')
+    status = body.get('status', 'active' if conception_date or due_date else 'planning')
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'pregnancy_insert', (
+            user_id, conception_date, due_date, status, body.get('notes', '')
+        ))
+
+        row = cur.fetchone()
+        conn.commit()
+
+        return json_response({
+            'id': row[0],
+            'conceptionDate': row[1].isoformat() if row[1] else None,
+            'dueDate': row[2].isoformat() if row[2] else None,
+            'status': row[3],
+            'notes': row[4],
+            'createdAt': row[5].isoformat() if row[5] else None
+        }, 201)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def create_event(user_id: int, body: dict) -> dict:
+    """Добавляет событие к беременности пользователя"""
+    pregnancy_id = body.get('pregnancyId')
+    event_date = body.get('eventDate')
+
+    if not pregnancy_id or not event_date:
+        return error_response('pregnancyId and eventDate are required', 400)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, 'pregnancy_event_insert', (
+            event_date, body.get('eventType'), body.get('title'), body.get('description', ''),
+            pregnancy_id, user_id
+        ))
+
+        row = cur.fetchone()
+        if not row:
+            conn.rollback()
+            return error_response('Pregnancy not found', 404)
+
+        conn.commit()
+
+        return json_response(event_from_row(row), 201)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def pregnancy_start(conception_date: date, due_date: date) -> date:
+    """Первый день последней менструации: зачатие минус 2 недели или роды минус 280 дней"""
+    if conception_date:
+        return conception_date - timedelta(days=14)
+    if due_date:
+        return due_date - timedelta(days=PREGNANCY_DAYS)
+    return None
+
+
+def week_of(start: date, day: date) -> int:
+    return min(max((day - start).days // 7 + 1, 1), MAX_WEEK)
+
+
+def trimester(week: int) -> int:
+    if week <= 13:
+        return 1
+    if week <= 27:
+        return 2
+    return 3
+
+
+def event_from_row(row: tuple) -> dict:
+    return {
+        'id': row[0],
+        'date': row[1].isoformat(),
+        'type': row[2],
+        'title': row[3],
+        'description': row[4]
+    }
+
+
+def execute_statement(cur, name: str, params: tuple) -> None:
+    """
+    Выполняет запрос из STATEMENTS как подготовленный на сервере.
+    При первом использовании на соединении PREPARE уходит отдельным
+    обращением, и имя отмечается сразу после него: подготовленный запрос
+    остается на сервере, даже если EXECUTE или вся транзакция затем упадет.
+    Если сервер потерял подготовленный запрос (соединение пересоздано или
+    сброшено пулером), он готовится заново; если запрос уже подготовлен,
+    хотя не отмечен, отметка восстанавливается. Повтор возможен только вне
+    транзакции, иначе ошибка пробрасывается, а следующий вызов уже пойдет
+    верным путем.
+    """
+    conn = cur.connection
+    with _prepared_lock:
+        state = _prepared.get(conn)
+        if state is None or state[0] != conn.info.backend_pid:
+            state = (conn.info.backend_pid, set())
+            _prepared[conn] = state
+
+    idle = conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    start = time.perf_counter()
+
+    try:
+        run_prepared(cur, name, params, state[1])
+    except InvalidSqlStatementName:
+        state[1].discard(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+    except DuplicatePreparedStatement:
+        state[1].add(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+
+    record_statement(name, time.perf_counter() - start)
+
+
+def run_prepared(cur, name: str, params: tuple, prepared: set) -> None:
+    """PREPARE с явными типами параметров: без них $n в выражениях выводятся неверно"""
+    types, sql = STATEMENTS[name]
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}")
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def record_statement(name: str, elapsed: float) -> None:
+    with _stats_lock:
+        stats = _statement_stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def statement_stats() -> list:
+    """Число вызовов и время по каждому запросу из STATEMENTS, самые дорогие первыми"""
+    with _stats_lock:
+        rows = [{
+            'statement': name,
+            'calls': calls,
+            'totalMs': round(total * 1000, 3),
+            'avgMs': round(total * 1000 / calls, 3),
+            'maxMs': round(peak * 1000, 3)
+        } for name, (calls, total, peak) in _statement_stats.items()]
+    return sorted(rows, key=lambda r: r['totalMs'], reverse=True)
+
+
+def get_user_from_token(event: dict) -> int:
+    """Извлекает user_id из JWT токена"""
+    auth_header = event.get('headers', {}).get('authorization') or event.get('headers', {}).get('Authorization')
+
+    if not auth_header:
+        raise ValueError('Authorization header required')
+
+    token = auth_header.replace('Bearer ', '')
+    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+
+    try:
+        payload = jwt.decode(token, secret, algorithms=['HS256'])
+        return payload['user_id']
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+
+def cors_response() -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def json_response(data: dict, status: int = 200) -> dict:
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(data),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(message: str, status_code: int) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,316 @@
+import json
+import os
+import sys
+import hmac
+import time
+import importlib
+import psycopg2
+from datetime import datetime
+
+BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', '100'))
+SWEEP_BUDGET_SECONDS = 20
+APPOINTMENT_LEAD = '24 hours'
+MEDICATION_GRACE = '2 hours'
+DEFAULT_TIMEZONE = 'Europe/Moscow'
+
+
+def handler(event: dict, context) -> dict:
+    """
+    Рассылка напоминаний о визитах к врачу и приеме лекарств.
+    Вызывается по расписанию с ключом REMINDERS_KEY; несколько параллельных
+    вызовов не отправят одно напоминание дважды.
+    """
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return cors_response()
+
+    if method != 'POST':
+        return error_response('Method not allowed', 405)
+
+    if not is_authorized(event):
+        return error_response('Forbidden', 403)
+
+    try:
+        return json_response(sweep(get_sink()))
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+def sweep(sink) -> dict:
+    """Забирает и отправляет напоминания пачками, пока они есть и не вышел бюджет времени"""
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    started = time.perf_counter()
+    latencies = []
+    sent = {'appointments': 0, 'medications': 0}
+    batches = 0
+
+    try:
+        while time.perf_counter() - started < SWEEP_BUDGET_SECONDS:
+            appointments = send_appointment_batch(conn, sink, latencies)
+            medications = send_medication_batch(conn, sink, latencies)
+            sent['appointments'] += appointments
+            sent['medications'] += medications
+            batches += 1
+            if appointments < BATCH_SIZE and medications < BATCH_SIZE:
+                break
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    total = sent['appointments'] + sent['medications']
+    latencies.sort()
+
+    return {
+        'sent': sent,
+        'batches': batches,
+        'seconds': round(elapsed, 3),
+        'rowsPerSecond': round(total / elapsed, 1) if elapsed > 0 else None,
+        'claimToSendMs': {
+            'p50': percentile_ms(latencies, 50),
+            'p95': percentile_ms(latencies, 95),
+            'max': percentile_ms(latencies, 100)
+        }
+    }
+
+
+def send_appointment_batch(conn, sink, latencies: list) -> int:
+    """
+    Блокирует пачку ближайших неотправленных визитов через SKIP LOCKED:
+    строки, занятые другим воркером, пропускаются, а не ждут.
+    """
+    cur = conn.cursor()
+
+    try:
+        cur.execute(f"""
+            SELECT a.id, a.user_id, a.appointment_date, a.specialist_type, a.location, u.email, u.name
+            FROM appointments a
+            JOIN users u ON u.id = a.user_id
+            LEFT JOIN user_settings s ON s.user_id = a.user_id
+            WHERE a.reminder_sent = false
+              AND a.appointment_date BETWEEN NOW() AND NOW() + INTERVAL '{APPOINTMENT_LEAD}'
+              AND a.status = 'scheduled'
+              AND COALESCE(s.reminders_appointments, true)
+            ORDER BY a.appointment_date
+            LIMIT %s
+            FOR UPDATE OF a SKIP LOCKED
+        """, (BATCH_SIZE,))
+
+        rows = cur.fetchall()
+        claimed_at = time.perf_counter()
+
+        delivered = []
+        try:
+            for row in rows:
+                sink({
+                    'kind': 'appointment',
+                    'appointmentId': row[0],
+                    'userId': row[1],
+                    'appointmentDate': row[2].isoformat(),
+                    'specialistType': row[3],
+                    'location': row[4],
+                    'email': row[5],
+                    'name': row[6]
+                })
+                delivered.append(row[0])
+                latencies.append(time.perf_counter() - claimed_at)
+        finally:
+            if delivered:
+                cur.execute("""
+                    UPDATE appointments SET reminder_sent = true, updated_at = NOW()
+                    WHERE id = ANY(%s)
+                """, (delivered,))
+            conn.commit()
+
+        return len(delivered)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def send_medication_batch(conn, sink, latencies: list) -> int:
+    """
+    Ежедневные напоминания о лекарствах: время приема сравнивается с локальным
+    временем пользователя. Перед отправкой напоминание занимается вставкой в
+    medication_reminders_sent на локальную дату: если другой воркер уже
+    записал (или пишет) ту же пару, ON CONFLICT не вернет строку и она не
+    отправится повторно. Неотправленные при ошибке заявки удаляются.
+    """
+    cur = conn.cursor()
+
+    try:
+        cur.execute(f"""
+            WITH due AS (
+                SELECT m.id, m.user_id, m.name, m.dosage, m.reminder_time,
+                       l.local_now::date AS remind_on, u.email, u.name AS user_name
+                FROM medications m
+                JOIN users u ON u.id = m.user_id
+                LEFT JOIN user_settings s ON s.user_id = m.user_id
+                CROSS JOIN LATERAL (
+                    SELECT NOW() AT TIME ZONE COALESCE(
+                        (SELECT timezone FROM user_profiles WHERE user_id = m.user_id LIMIT 1), %s
+                    ) AS local_now
+                ) l
+                WHERE m.active AND m.reminder_time IS NOT NULL
+                  AND l.local_now::time - m.reminder_time BETWEEN INTERVAL '0' AND INTERVAL '{MEDICATION_GRACE}'
+                  AND (m.start_date IS NULL OR m.start_date <= l.local_now::date)
+                  AND (m.end_date IS NULL OR m.end_date >= l.local_now::date)
+                  AND COALESCE(s.reminders_medication, true)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM medication_reminders_sent r
+                      WHERE r.medication_id = m.id AND r.remind_on = l.local_now::date
+                  )
+                ORDER BY m.reminder_time, m.id
+                LIMIT %s
+                FOR UPDATE OF m SKIP LOCKED
+            ), claimed AS (
+                INSERT INTO medication_reminders_sent (medication_id, remind_on)
+                SELECT id, remind_on FROM due
+                ON CONFLICT DO NOTHING
+                RETURNING medication_id, remind_on
+            )
+            SELECT due.id, due.user_id, due.name, due.dosage, due.reminder_time, due.remind_on,
+                   due.email, due.user_name
+            FROM due
+            JOIN claimed ON claimed.medication_id = due.id AND claimed.remind_on = due.remind_on
+            ORDER BY due.reminder_time, due.id
+        """, (DEFAULT_TIMEZONE, BATCH_SIZE))
+
+        rows = cur.fetchall()
+        claimed_at = time.perf_counter()
+
+        delivered = set()
+        try:
+            for row in rows:
+                sink({
+                    'kind': 'medication',
+                    'medicationId': row[0],
+                    'userId': row[1],
+                    'medication': row[2],
+                    'dosage': row[3],
+                    'reminderTime': row[4].strftime('%H:%M'),
+                    'date': row[5].isoformat(),
+                    'email': row[6],
+                    'name': row[7]
+                })
+                delivered.add(row[0])
+                latencies.append(time.perf_counter() - claimed_at)
+        finally:
+            undelivered = [row for row in rows if row[0] not in delivered]
+            if undelivered:
+                cur.execute("""
+                    DELETE FROM medication_reminders_sent
+                    WHERE (medication_id, remind_on) IN (
+                        SELECT * FROM unnest(%s::integer[], %s::date[])
+                    )
+                """, ([r[0] for r in undelivered], [r[5] for r in undelivered]))
+            conn.commit()
+
+        return len(delivered)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def log_sink(message: dict) -> None:
+    """Пишет напоминание JSON-строкой в stdout (журнал функции)"""
+    print(json.dumps(message, ensure_ascii=False), flush=True)
+
+
+def file_sink(path: str):
+    """Дописывает напоминания JSON-строками в локальный файл"""
+    def write(message: dict) -> None:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(message, ensure_ascii=False) + '\n')
+    return write
+
+
+def get_sink():
+    """
+    Получатель напоминаний из REMINDER_SINK:
+    'log' (по умолчанию), 'file:/path/to/file.jsonl' или 'module:function'.
+    """
+    spec = os.environ.get('REMINDER_SINK', 'log')
+
+    if spec == 'log':
+        return log_sink
+    if spec.startswith('file:'):
+        return file_sink(spec[len('file:'):])
+    if ':' in spec:
+        module_name, _, attr = spec.partition(':')
+        return getattr(importlib.import_module(module_name), attr)
+
+    raise ValueError(f'Unknown REMINDER_SINK: {spec}')
+
+
+def percentile_ms(values: list, percentile: int) -> float:
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(len(values) * percentile / 100) - 1))
+    return round(values[index] * 1000, 3)
+
+
+def is_authorized(event: dict) -> bool:
+    """Запуск по расписанию с ключом REMINDERS_KEY"""
+    expected = os.environ.get('REMINDERS_KEY')
+    headers = event.get('headers', {}) or {}
+    provided = headers.get('x-reminders-key') or headers.get('X-Reminders-Key') or ''
+    return bool(expected) and hmac.compare_digest(provided, expected)
+
+
+def cors_response() -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-Reminders-Key',
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def json_response(data: dict, status: int = 200) -> dict:
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(data),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(message: str, status_code: int) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
+
+
+if __name__ == '__main__':
+    interval = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    sink = get_sink()
+    while True:
+        started = time.monotonic()
+        try:
+            result = {'sweep': sweep(sink)}
+        except Exception as e:
+            # Ошибка отправки или БД не должна останавливать воркер: следующий
+            # проход заберет те же строки заново
+            result = {'error': str(e)}
+        result['at'] = datetime.now().isoformat()
+        print(json.dumps(result), file=sys.stderr, flush=True)
+        time.sleep(max(0, interval - (time.monotonic() - started)))
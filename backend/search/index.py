@@ -0,0 +1,291 @@
+import json
+import os
+import base64
+import time
+import threading
+import weakref
+import psycopg2
+from psycopg2.errors import InvalidSqlStatementName, DuplicatePreparedStatement
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+import jwt
+
+PAGE_SIZE = 20
+PAGE_MAX = 50
+MAX_QUERY_LENGTH = 200
+
+SOURCES = ('diary', 'log', 'cycle', 'symptom')
+
+SEARCH_SQL = """
+    WITH q AS (
+        SELECT websearch_to_tsquery('russian', $1) || websearch_to_tsquery('english', $1) AS query
+    ), hits AS (
+        SELECT 'diary' AS source, d.id, d.entry_date AS entry_date, d.title, d.content AS body,
+               ts_rank(d.search_vector, q.query) AS rank
+        FROM diary_entries d, q
+        WHERE d.user_id = $2 AND d.search_vector @@ q.query
+        UNION ALL
+        SELECT 'log', l.id, l.log_date, NULL, l.notes,
+               ts_rank(l.search_vector, q.query)
+        FROM daily_logs l, q
+        WHERE l.user_id = $2 AND l.search_vector @@ q.query
+        UNION ALL
+        SELECT 'cycle', c.id, c.start_date, NULL, c.notes,
+               ts_rank(c.search_vector, q.query)
+        FROM cycles c, q
+        WHERE c.user_id = $2 AND c.search_vector @@ q.query
+        UNION ALL
+        SELECT 'symptom', s.id, s.log_date, s.symptom_type, s.notes,
+               ts_rank(s.search_vector, q.query)
+        FROM symptoms s, q
+        WHERE s.user_id = $2 AND s.search_vector @@ q.query
+    ), page AS (
+        SELECT source, id, entry_date, title, body, rank
+        FROM hits
+        {after}
+        ORDER BY rank DESC, source DESC, id DESC
+        LIMIT $3
+    )
+    SELECT page.source, page.id, page.entry_date, page.title,
+           ts_headline('russian', COALESCE(page.body, ''), q.query,
+                       'MaxFragments=2, MaxWords=20, MinWords=5'),
+           page.rank
+    FROM page, q
+    ORDER BY page.rank DESC, page.source DESC, page.id DESC
+"""
+
+AFTER_CLAUSE = "WHERE (rank, source, id) < ($4, $5, $6)"
+
+STATEMENTS = {
+    'search_first': (('text', 'integer', 'integer'), SEARCH_SQL.format(after='')),
+    'search_after': (('text', 'integer', 'integer', 'real', 'text', 'integer'), SEARCH_SQL.format(after=AFTER_CLAUSE))
+}
+
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_statement_stats = {}
+_stats_lock = threading.Lock()
+
+
+def handler(event: dict, context) -> dict:
+    """
+    Полнотекстовый поиск по записям пользователя:
+    - Дневник, заметки дня, заметки циклов и симптомов
+    - Ранжирование по релевантности, курсорная пагинация
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return cors_response()
+
+    try:
+        user_id = get_user_from_token(event)
+
+        if method == 'GET':
+            return search_notes(user_id, event)
+        else:
+            return error_response('Method not allowed', 405)
+
+    except ValueError as e:
+        return error_response(str(e), 401)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+def search_notes(user_id: int, event: dict) -> dict:
+    """Ищет по GIN-индексам всех источников и возвращает одну ранжированную ленту"""
+    params = event.get('queryStringParameters', {}) or {}
+    query = (params.get('q') or '').strip()
+
+    if not query:
+        return error_response('q is required', 400)
+    if len(query) > MAX_QUERY_LENGTH:
+        return error_response('Query too long', 400)
+
+    try:
+        limit = min(int(params.get('limit', PAGE_SIZE)), PAGE_MAX)
+    except ValueError:
+        return error_response('Invalid limit', 400)
+    if limit < 1:
+        return error_response('Invalid limit', 400)
+
+    statement = 'search_first'
+    sql_params = (query, user_id, limit + 1)
+
+    cursor = params.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return error_response('Invalid cursor', 400)
+        statement = 'search_after'
+        sql_params += position
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        execute_statement(cur, statement, sql_params)
+        rows = cur.fetchall()
+
+        results = []
+        for row in rows[:limit]:
+            results.append({
+                'source': row[0],
+                'id': row[1],
+                'date': row[2].isoformat() if row[2] else None,
+                'title': row[3],
+                'snippet': row[4],
+                'rank': row[5]
+            })
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last[5], last[0], last[1])
+
+        return json_response({'results': results, 'nextCursor': next_cursor})
+    finally:
+        cur.close()
+        conn.close()
+
+
+def encode_cursor(rank: float, source: str, row_id: int) -> str:
+    raw = json.dumps([rank, source, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Разбирает курсор (rank, source, id); None при некорректном значении"""
+    try:
+        rank, source, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if source not in SOURCES:
+            return None
+        return float(rank), source, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def execute_statement(cur, name: str, params: tuple) -> None:
+    """
+    Выполняет запрос из STATEMENTS как подготовленный на сервере.
+    При первом использовании на соединении PREPARE уходит отдельным
+    обращением, и имя отмечается сразу после него: подготовленный запрос
+    остается на сервере, даже если EXECUTE или вся транзакция затем упадет.
+    Если сервер потерял подготовленный запрос (соединение пересоздано или
+    сброшено пулером), он готовится заново; если запрос уже подготовлен,
+    хотя не отмечен, отметка восстанавливается. Повтор возможен только вне
+    транзакции, иначе ошибка пробрасывается, а следующий вызов уже пойдет
+    верным путем.
+    """
+    conn = cur.connection
+    with _prepared_lock:
+        state = _prepared.get(conn)
+        if state is None or state[0] != conn.info.backend_pid:
+            state = (conn.info.backend_pid, set())
+            _prepared[conn] = state
+
+    idle = conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    start = time.perf_counter()
+
+    try:
+        run_prepared(cur, name, params, state[1])
+    except InvalidSqlStatementName:
+        state[1].discard(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+    except DuplicatePreparedStatement:
+        state[1].add(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+
+    record_statement(name, time.perf_counter() - start)
+
+
+def run_prepared(cur, name: str, params: tuple, prepared: set) -> None:
+    """PREPARE с явными типами параметров: без них $n в выражениях выводятся неверно"""
+    types, sql = STATEMENTS[name]
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}")
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def record_statement(name: str, elapsed: float) -> None:
+    with _stats_lock:
+        stats = _statement_stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def statement_stats() -> list:
+    """Число вызовов и время по каждому запросу из STATEMENTS, самые дорогие первыми"""
+    with _stats_lock:
+        rows = [{
+            'statement': name,
+            'calls': calls,
+            'totalMs': round(total * 1000, 3),
+            'avgMs': round(total * 1000 / calls, 3),
+            'maxMs': round(peak * 1000, 3)
+        } for name, (calls, total, peak) in _statement_stats.items()]
+    return sorted(rows, key=lambda r: r['totalMs'], reverse=True)
+
+
+def get_user_from_token(event: dict) -> int:
+    """Извлекает user_id из JWT токена"""
+    auth_header = event.get('headers', {}).get('authorization') or event.get('headers', {}).get('Authorization')
+
+    if not auth_header:
+        raise ValueError('Authorization header required')
+
+    token = auth_header.replace('Bearer ', '')
+    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+
+    try:
+        payload = jwt.decode(token, secret, algorithms=['HS256'])
+        return payload['user_id']
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+
+def cors_response() -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def json_response(data: dict, status: int = 200) -> dict:
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(data),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(message: str, status_code: int) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
@@ -1,9 +1,89 @@
 import json
 import os
+import time
+import threading
+import weakref
+import gzip
+import base64
 import psycopg2
+from psycopg2.errors import InvalidSqlStatementName, DuplicatePreparedStatement
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from datetime import datetime, date
 import jwt
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+
+TREND_METRICS = {
+    'sleep': 'sleep_hours',
+    'weight': 'weight',
+    'water': 'water_glasses',
+    'energy': 'energy_level',
+    'temperature': 'temperature'
+}
+TREND_BUCKETS = ('week', 'month')
+TREND_MAX_RANGE = 3660
+
+STATEMENTS = {
+    'tracking_daily_log_by_date': (('integer', 'date'), """
+        SELECT log_date, mood, pain_level, flow_intensity, energy_level,
+               sleep_hours, water_glasses, exercise_minutes, calories_intake,
+               weight, temperature, notes
+        FROM daily_logs
+        WHERE user_id = $1 AND log_date = $2
+    """),
+    'tracking_symptoms_by_date': (('integer', 'date'), """
+        SELECT symptom_type, severity, notes
+        FROM symptoms
+        WHERE user_id = $1 AND log_date = $2
+    """),
+    'tracking_daily_log_range': (('integer', 'date', 'integer'), """
+        SELECT log_date, mood, pain_level, flow_intensity, energy_level,
+               sleep_hours, water_glasses, exercise_minutes, calories_intake, weight
+        FROM daily_logs
+        WHERE user_id = $1 AND log_date >= $2::date - $3
+        ORDER BY log_date DESC
+    """),
+    'tracking_daily_log_upsert': (('integer', 'date', 'integer', 'integer', 'integer', 'integer', 'numeric', 'integer', 'integer', 'integer', 'numeric', 'numeric', 'text'), """
+        INSERT INTO daily_logs
+        (user_id, log_date, mood, pain_level, flow_intensity, energy_level,
+         sleep_hours, water_glasses, exercise_minutes, calories_intake, weight, temperature, notes)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+        ON CONFLICT (user_id, log_date)
+        DO UPDATE SET
+            mood = COALESCE(EXCLUDED.mood, daily_logs.mood),
+            pain_level = COALESCE(EXCLUDED.pain_level, daily_logs.pain_level),
+            flow_intensity = COALESCE(EXCLUDED.flow_intensity, daily_logs.flow_intensity),
+            energy_level = COALESCE(EXCLUDED.energy_level, daily_logs.energy_level),
+            sleep_hours = COALESCE(EXCLUDED.sleep_hours, daily_logs.sleep_hours),
+            water_glasses = COALESCE(EXCLUDED.water_glasses, daily_logs.water_glasses),
+            exercise_minutes = COALESCE(EXCLUDED.exercise_minutes, daily_logs.exercise_minutes),
+            calories_intake = COALESCE(EXCLUDED.calories_intake, daily_logs.calories_intake),
+            weight = COALESCE(EXCLUDED.weight, daily_logs.weight),
+            temperature = COALESCE(EXCLUDED.temperature, daily_logs.temperature),
+            notes = COALESCE(EXCLUDED.notes, daily_logs.notes),
+            updated_at = NOW()
+        RETURNING log_date, mood, pain_level, flow_intensity, energy_level,
+                  sleep_hours, water_glasses, exercise_minutes, calories_intake, weight, temperature, notes
+    """),
+    'tracking_symptoms_delete': (('integer', 'date'), """
+        DELETE FROM symptoms WHERE user_id = $1 AND log_date = $2
+    """),
+    'tracking_symptom_insert': (('integer', 'date', 'varchar', 'integer', 'text'), """
+        INSERT INTO symptoms (user_id, log_date, symptom_type, severity, notes)
+        VALUES ($1, $2, $3, $4, $5)
+    """)
+}
+
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_statement_stats = {}
+_stats_lock = threading.Lock()
+
 def handler(event: dict, context) -> dict:
     """
     API для ежедневного отслеживания:
@@ -20,6 +100,9 @@ def handler(event: dict, context) -> dict:
         user_id = get_user_from_token(event)
         
         if method == 'GET':
+            params = event.get('queryStringParameters', {}) or {}
+            if params.get('mode') == 'trends':
+                return get_trends(user_id, event)
             return get_daily_log(user_id, event)
         elif method == 'POST':
             return save_daily_log(user_id, event)
@@ -45,21 +128,11 @@ def get_daily_log(user_id: int, event: dict) -> dict:
     
     try:
         if range_days == 1:
-            cur.execute("""
-                SELECT log_date, mood, pain_level, flow_intensity, energy_level,
-                       sleep_hours, water_glasses, exercise_minutes, calories_intake,
-                       weight, temperature, notes
-                FROM daily_logs
-                WHERE user_id = %s AND log_date = %s
-            """, (user_id, log_date))
+            execute_statement(cur, 'tracking_daily_log_by_date', (user_id, log_date))
             
             row = cur.fetchone()
             
-            cur.execute("""
-                SELECT symptom_type, severity, notes
-                FROM symptoms
-                WHERE user_id = %s AND log_date = %s
-            """, (user_id, log_date))
+            execute_statement(cur, 'tracking_symptoms_by_date', (user_id, log_date))
             
             symptoms = [{'type': r[0], 'severity': r[1], 'notes': r[2]} for r in cur.fetchall()]
             
@@ -85,15 +158,9 @@ def get_daily_log(user_id: int, event: dict) -> dict:
                     'symptoms': symptoms
                 }
             
-            return json_response(log)
+            return json_response(log, event=event)
         else:
-            cur.execute("""
-                SELECT log_date, mood, pain_level, flow_intensity, energy_level,
-                       sleep_hours, water_glasses, exercise_minutes, calories_intake, weight
-                FROM daily_logs
-                WHERE user_id = %s AND log_date >= %s::date - %s
-                ORDER BY log_date DESC
-            """, (user_id, log_date, range_days))
+            execute_statement(cur, 'tracking_daily_log_range', (user_id, log_date, range_days))
             
             logs = []
             for row in cur.fetchall():
@@ -110,7 +177,89 @@ def get_daily_log(user_id: int, event: dict) -> dict:
                     'weight': float(row[9]) if row[9] else None
                 })
             
-            return json_response({'logs': logs})
+            if params.get('layout') == 'columnar':
+                return json_response({'logs': to_columnar(logs)}, event=event)
+            return json_response({'logs': logs}, event=event)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_trends(user_id: int, event: dict) -> dict:
+    """
+    Прореженные ряды метрик для графиков: среднее, минимум, максимум по неделям
+    или месяцам и скользящее 7-дневное среднее на конец интервала.
+    Считается в SQL оконными функциями по индексу (user_id, log_date).
+    """
+    params = event.get('queryStringParameters', {}) or {}
+    end_date = params.get('date', date.today().isoformat())
+    bucket = params.get('bucket', 'week')
+    metrics = list(dict.fromkeys(
+        m.strip() for m in params.get('metrics', ','.join(TREND_METRICS)).split(',') if m.strip()
+    ))
+
+    if bucket not in TREND_BUCKETS:
+        return error_response(f'Unknown bucket: {bucket}', 400)
+    unknown = [m for m in metrics if m not in TREND_METRICS]
+    if unknown or not metrics:
+        return error_response(f'Unknown metrics: {", ".join(unknown)}', 400)
+    try:
+        range_days = int(params.get('range', 365))
+        date.fromisoformat(end_date)
+    except ValueError:
+        return error_response('Invalid range or date', 400)
+    if range_days < 1 or range_days > TREND_MAX_RANGE:
+        return error_response('Invalid range or date', 400)
+
+    columns = [TREND_METRICS[m] for m in metrics]
+    rolling = ',\n'.join(f'AVG({c}) OVER last_week AS {c}_rolling' for c in columns)
+    aggregates = ',\n'.join(
+        f'AVG({c}), MIN({c}), MAX({c}), COUNT({c}), '
+        f'(ARRAY_AGG({c}_rolling ORDER BY log_date DESC) FILTER (WHERE {c} IS NOT NULL))[1]'
+        for c in columns
+    )
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        cur.execute(f"""
+            WITH series AS (
+                SELECT log_date, {', '.join(columns)},
+                       {rolling}
+                FROM daily_logs
+                WHERE user_id = %s AND log_date > %s::date - %s - 6 AND log_date <= %s::date
+                WINDOW last_week AS (ORDER BY log_date RANGE BETWEEN INTERVAL '6 days' PRECEDING AND CURRENT ROW)
+            )
+            SELECT date_trunc(%s, log_date::timestamp)::date AS bucket_start,
+                   {aggregates}
+            FROM series
+            WHERE log_date > %s::date - %s
+            GROUP BY bucket_start
+            ORDER BY bucket_start
+        """, (user_id, end_date, range_days, end_date, bucket, end_date, range_days))
+
+        series = {m: [] for m in metrics}
+        for row in cur.fetchall():
+            for i, metric in enumerate(metrics):
+                avg, low, high, count, rolling_avg = row[1 + i * 5:6 + i * 5]
+                if not count:
+                    continue
+                series[metric].append({
+                    'start': row[0].isoformat(),
+                    'avg': round(float(avg), 2),
+                    'min': float(low),
+                    'max': float(high),
+                    'count': count,
+                    'rolling7': round(float(rolling_avg), 2) if rolling_avg is not None else None
+                })
+
+        return json_response({
+            'bucket': bucket,
+            'to': end_date,
+            'range': range_days,
+            'series': series
+        }, event=event)
     finally:
         cur.close()
         conn.close()
@@ -138,40 +287,20 @@ def save_daily_log(user_id: int, event: dict) -> dict:
     cur = conn.cursor()
     
     try:
-        cur.execute("""
-            INSERT INTO daily_logs 
-            (user_id, log_date, mood, pain_level, flow_intensity, energy_level,
-             sleep_hours, water_glasses, exercise_minutes, calories_intake, weight, temperature, notes)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (user_id, log_date) 
-            DO UPDATE SET
-                mood = COALESCE(EXCLUDED.mood, daily_logs.mood),
-                pain_level = COALESCE(EXCLUDED.pain_level, daily_logs.pain_level),
-                flow_intensity = COALESCE(EXCLUDED.flow_intensity, daily_logs.flow_intensity),
-                energy_level = COALESCE(EXCLUDED.energy_level, daily_logs.energy_level),
-                sleep_hours = COALESCE(EXCLUDED.sleep_hours, daily_logs.sleep_hours),
-                water_glasses = COALESCE(EXCLUDED.water_glasses, daily_logs.water_glasses),
-                exercise_minutes = COALESCE(EXCLUDED.exercise_minutes, daily_logs.exercise_minutes),
-                calories_intake = COALESCE(EXCLUDED.calories_intake, daily_logs.calories_intake),
-                weight = COALESCE(EXCLUDED.weight, daily_logs.weight),
-                temperature = COALESCE(EXCLUDED.temperature, daily_logs.temperature),
-                notes = COALESCE(EXCLUDED.notes, daily_logs.notes),
-                updated_at = NOW()
-            RETURNING log_date, mood, pain_level, flow_intensity, energy_level,
-                      sleep_hours, water_glasses, exercise_minutes, calories_intake, weight, temperature, notes
-        """, (user_id, log_date, mood, pain_level, flow_intensity, energy_level,
-              sleep_hours, water_glasses, exercise_minutes, calories_intake, weight, temperature, notes))
+        execute_statement(cur, 'tracking_daily_log_upsert', (
+            user_id, log_date, mood, pain_level, flow_intensity, energy_level,
+            sleep_hours, water_glasses, exercise_minutes, calories_intake, weight, temperature, notes
+        ))
         
         row = cur.fetchone()
         
         if symptoms:
-            cur.execute("DELETE FROM symptoms WHERE user_id = %s AND log_date = %s", (user_id, log_date))
+            execute_statement(cur, 'tracking_symptoms_delete', (user_id, log_date))
             
             for symptom in symptoms:
-                cur.execute("""
-                    INSERT INTO symptoms (user_id, log_date, symptom_type, severity, notes)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (user_id, log_date, symptom.get('type'), symptom.get('severity', 3), symptom.get('notes', '')))
+                execute_statement(cur, 'tracking_symptom_insert', (
+                    user_id, log_date, symptom.get('type'), symptom.get('severity', 3), symptom.get('notes', '')
+                ))
         
         conn.commit()
         
@@ -202,6 +331,76 @@ def update_daily_log(user_id: int, event: dict) -> dict:
     return save_daily_log(user_id, event)
 
 
+def execute_statement(cur, name: str, params: tuple) -> None:
+    """
+    Выполняет запрос из STATEMENTS как подготовленный на сервере.
+    При первом использовании на соединении PREPARE уходит отдельным
+    обращением, и имя отмечается сразу после него: подготовленный запрос
+    остается на сервере, даже если EXECUTE или вся транзакция затем упадет.
+    Если сервер потерял подготовленный запрос (соединение пересоздано или
+    сброшено пулером), он готовится заново; если запрос уже подготовлен,
+    хотя не отмечен, отметка восстанавливается. Повтор возможен только вне
+    транзакции, иначе ошибка пробрасывается, а следующий вызов уже пойдет
+    верным путем.
+    """
+    conn = cur.connection
+    with _prepared_lock:
+        state = _prepared.get(conn)
+        if state is None or state[0] != conn.info.backend_pid:
+            state = (conn.info.backend_pid, set())
+            _prepared[conn] = state
+
+    idle = conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    start = time.perf_counter()
+
+    try:
+        run_prepared(cur, name, params, state[1])
+    except InvalidSqlStatementName:
+        state[1].discard(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+    except DuplicatePreparedStatement:
+        state[1].add(name)
+        if not idle:
+            raise
+        conn.rollback()
+        run_prepared(cur, name, params, state[1])
+
+    record_statement(name, time.perf_counter() - start)
+
+
+def run_prepared(cur, name: str, params: tuple, prepared: set) -> None:
+    """PREPARE с явными типами параметров: без них $n в выражениях выводятся неверно"""
+    types, sql = STATEMENTS[name]
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}")
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def record_statement(name: str, elapsed: float) -> None:
+    with _stats_lock:
+        stats = _statement_stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def statement_stats() -> list:
+    """Число вызовов и время по каждому запросу из STATEMENTS, самые дорогие первыми"""
+    with _stats_lock:
+        rows = [{
+            'statement': name,
+            'calls': calls,
+            'totalMs': round(total * 1000, 3),
+            'avgMs': round(total * 1000 / calls, 3),
+            'maxMs': round(peak * 1000, 3)
+        } for name, (calls, total, peak) in _statement_stats.items()]
+    return sorted(rows, key=lambda r: r['totalMs'], reverse=True)
+
+
 def get_user_from_token(event: dict) -> int:
     """Извлекает user_id из JWT токена"""
     auth_header = event.get('headers', {}).get('authorization') or event.get('headers', {}).get('Authorization')
@@ -235,15 +434,70 @@ def cors_response() -> dict:
     }
 
 
-def json_response(data: dict, status: int = 200) -> dict:
+def json_response(data: dict, status: int = 200, event: dict = None) -> dict:
+    """JSON-ответ; крупные тела сжимаются по Accept-Encoding и отдаются в base64"""
+    body = json.dumps(data)
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    encoding = negotiate_encoding(event) if event and len(body) >= COMPRESS_MIN_BYTES else None
+    if not encoding:
+        return {
+            'statusCode': status,
+            'headers': headers,
+            'body': body,
+            'isBase64Encoded': False
+        }
+
+    if encoding == 'br':
+        payload = brotli.compress(body.encode('utf-8'), quality=5)
+    else:
+        payload = gzip.compress(body.encode('utf-8'), compresslevel=6)
+
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = 'Accept-Encoding'
+
     return {
         'statusCode': status,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps(data),
-        'isBase64Encoded': False
+        'headers': headers,
+        'body': base64.b64encode(payload).decode(),
+        'isBase64Encoded': True
+    }
+
+
+def negotiate_encoding(event: dict) -> str:
+    """Выбирает br или gzip из Accept-Encoding с учетом q-весов"""
+    headers = event.get('headers', {}) or {}
+    accept = headers.get('accept-encoding') or headers.get('Accept-Encoding') or ''
+
+    weights = {}
+    for part in accept.split(','):
+        token, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[token.strip().lower()] = q
+
+    candidates = ['br', 'gzip'] if brotli else ['gzip']
+    best = None
+    for name in candidates:
+        q = weights.get(name, weights.get('*', 0.0))
+        if q > 0 and (best is None or q > weights.get(best, weights.get('*', 0.0))):
+            best = name
+    return best
+
+
+def to_columnar(rows: list) -> dict:
+    """Список однотипных объектов в виде {'columns': [...], 'rows': [[...], ...]}"""
+    columns = list(rows[0].keys()) if rows else []
+    return {
+        'columns': columns,
+        'rows': [[row.get(c) for c in columns] for row in rows]
     }
 
 
@@ -0,0 +1,135 @@
+"""
+Сравнение serverless-пути (handler + новое подключение на каждый запрос)
+с ASGI-сервером из server/app.py на пуле соединений.
+
+Serverless-путь открывает соединение на каждый запрос, поэтому его число
+потоков ограничивается свободными соединениями: max_connections за вычетом
+уже открытых (в том числе пулов сервера) и CONNECTION_RESERVE.
+
+Сервер запускается отдельно, например на 1 и на N процессах:
+    DATABASE_URL=... python server/app.py --workers 4 --port 8000
+
+Запуск:
+    DATABASE_URL=... python benchmarks/asgi_server.py --url http://127.0.0.1:8000 \
+        --requests 2000 --concurrency 1,8,32,128
+"""
+import argparse
+import http.client
+import importlib.util
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+import jwt
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONNECTION_RESERVE = 10
+
+
+def load_handler(name: str):
+    spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(ROOT, 'backend', name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_token(user_id: int) -> str:
+    payload = {'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, os.environ.get('JWT_SECRET', 'default-secret-key'), algorithm='HS256')
+
+
+def seed_user() -> int:
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (email, name) VALUES ('bench-asgi@example.com', 'bench')
+        ON CONFLICT (email) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+    """)
+    user_id = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    conn.close()
+    return user_id
+
+
+def max_concurrency(requested: int) -> int:
+    """Не больше потоков, чем сервер примет новых соединений"""
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute("SHOW max_connections")
+    limit = int(cur.fetchone()[0]) - CONNECTION_RESERVE
+    cur.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE backend_type = 'client backend'")
+    limit -= cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    if requested > limit:
+        print(f'concurrency {requested} exceeds free connections, serverless uses {limit}')
+        return limit
+    return requested
+
+
+def run(fn, requests: int, concurrency: int) -> tuple:
+    def timed(_):
+        start = time.perf_counter()
+        status = fn()
+        if status >= 400:
+            raise RuntimeError(f'status {status}')
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(timed, range(requests)))
+    return latencies, time.perf_counter() - start
+
+
+def report(label: str, concurrency: int, latencies: list, wall: float) -> None:
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f'{label:<12} c={concurrency:<4} rps={len(latencies) / wall:>9.1f} '
+          f'p50={statistics.median(latencies) * 1000:>7.2f}ms p99={p99 * 1000:>7.2f}ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', default='1,8,32,128')
+    args = parser.parse_args()
+
+    token = make_token(seed_user())
+    cycles = load_handler('cycles')
+    event = {
+        'httpMethod': 'GET',
+        'headers': {'Authorization': f'Bearer {token}'},
+        'queryStringParameters': {'limit': '12'}
+    }
+
+    target = urlparse(args.url)
+    local = threading.local()
+
+    def serverless() -> int:
+        return cycles.handler(event, None)['statusCode']
+
+    def server() -> int:
+        if not hasattr(local, 'conn'):
+            local.conn = http.client.HTTPConnection(target.hostname, target.port or 80)
+        local.conn.request('GET', '/cycles?limit=12', headers={'Authorization': f'Bearer {token}'})
+        response = local.conn.getresponse()
+        response.read()
+        return response.status
+
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        serverless_concurrency = max_concurrency(concurrency)
+        report('serverless', serverless_concurrency, *run(serverless, args.requests, serverless_concurrency))
+        report('asgi', concurrency, *run(server, args.requests, concurrency))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
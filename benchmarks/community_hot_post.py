@@ -0,0 +1,162 @@
+"""
+Нагрузочный тест сообщества: тысячи параллельных читателей одного горячего поста
+и поток лайков к нему же.
+
+Сравнивает буферизованные лайки (community_counter_deltas + пакетный слив)
+с прямым UPDATE likes_count на каждый лайк, а также чтение с кэшем первой
+страницы и без него. Каждый лайк ставит отдельный пользователь, так как
+повторный лайк того же пользователя не засчитывается.
+
+Функции открывают соединение на каждый вызов, поэтому число потоков
+ограничивается max_connections сервера за вычетом CONNECTION_RESERVE.
+
+Запуск:
+    DATABASE_URL=postgresql://localhost/cycle_bench python benchmarks/community_hot_post.py \
+        --readers 2000 --likes 2000 --concurrency 50
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import jwt
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONNECTION_RESERVE = 10
+
+
+def load_handler(name: str):
+    spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(ROOT, 'backend', name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_token(user_id: int) -> str:
+    payload = {'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, os.environ.get('JWT_SECRET', 'default-secret-key'), algorithm='HS256')
+
+
+def seed(conn, likers: int) -> tuple:
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (email, name) VALUES ('bench-community@example.com', 'bench')
+        ON CONFLICT (email) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+    """)
+    user_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO community_posts (user_id, category, title, content)
+        VALUES (%s, 'bench', 'Горячий пост', 'Текст горячего поста')
+        RETURNING id
+    """, (user_id,))
+    post_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO users (email, name)
+        SELECT 'bench-liker-' || i || '@example.com', 'bench liker'
+        FROM generate_series(1, %s) i
+        ON CONFLICT (email) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+    """, (likers,))
+    liker_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    cur.close()
+    return user_id, post_id, liker_ids
+
+
+def max_concurrency(conn, requested: int) -> int:
+    """Не больше потоков, чем сервер примет соединений"""
+    cur = conn.cursor()
+    cur.execute("SHOW max_connections")
+    limit = int(cur.fetchone()[0]) - CONNECTION_RESERVE
+    cur.close()
+    if requested > limit:
+        print(f'--concurrency {requested} exceeds max_connections, using {limit}')
+        return limit
+    return requested
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    response = fn(*args)
+    if response['statusCode'] >= 400:
+        raise RuntimeError(response['body'])
+    return time.perf_counter() - start
+
+
+def report(label: str, latencies: list, wall: float) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f'{label:<32} n={len(latencies):<6} rps={len(latencies) / wall:>9.1f} '
+          f'p50={statistics.median(latencies) * 1000:>7.2f}ms p99={p99 * 1000:>7.2f}ms')
+
+
+def run(pool: ThreadPoolExecutor, calls: list) -> tuple:
+    start = time.perf_counter()
+    latencies = list(pool.map(lambda call: timed(*call), calls))
+    return latencies, time.perf_counter() - start
+
+
+def direct_like(post_id: int):
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE community_posts SET likes_count = likes_count + 1 WHERE id = %s", (post_id,))
+        conn.commit()
+        return {'statusCode': 200}
+    finally:
+        cur.close()
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=2000)
+    parser.add_argument('--likes', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    community = load_handler('community')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    user_id, post_id, liker_ids = seed(conn, args.likes * 2)
+    headers = {'Authorization': f'Bearer {make_token(user_id)}'}
+    concurrency = max_concurrency(conn, args.concurrency)
+
+    read_event = {'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': {'postId': str(post_id)}}
+    like_events = [
+        {'httpMethod': 'POST', 'headers': {'Authorization': f'Bearer {make_token(liker)}'},
+         'body': f'{{"action": "like", "postId": {post_id}}}'}
+        for liker in liker_ids
+    ]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        community.CACHE_TTL_SECONDS = 0
+        report('read, no cache', *run(pool, [(community.handler, read_event, None)] * args.readers))
+
+        community.CACHE_TTL_SECONDS = 10
+        report('read, cached first page', *run(pool, [(community.handler, read_event, None)] * args.readers))
+
+        report('like, UPDATE per like', *run(pool, [(direct_like, post_id)] * args.likes))
+        report('like, buffered deltas', *run(pool, [(community.handler, e, None) for e in like_events[:args.likes]]))
+
+        mixed = [(community.handler, read_event, None)] * args.readers + \
+            [(community.handler, e, None) for e in like_events[args.likes:]]
+        report('mixed read + buffered like', *run(pool, mixed))
+
+    while community.flush_counters(conn):
+        pass
+    cur = conn.cursor()
+    cur.execute("SELECT likes_count FROM community_posts WHERE id = %s", (post_id,))
+    print(f'likes_count after flush: {cur.fetchone()[0]} (expected {args.likes * 3})')
+    cur.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
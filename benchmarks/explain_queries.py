@@ -0,0 +1,271 @@
+"""
+EXPLAIN (ANALYZE, BUFFERS) для каждого запроса функций на разных объемах данных.
+
+Функции из backend/ вызываются как есть, но psycopg2.connect внутри них
+подменен записывающим соединением: все отправленные запросы сохраняются,
+а commit() превращается в rollback(), чтобы набор данных не менялся.
+Затем каждый записанный запрос выполняется под EXPLAIN, и планы с Seq Scan
+по большим таблицам помечаются. Сценарий, в котором функция упала,
+печатается и пропускается, прогон остальных продолжается.
+
+Запуск (дозаливает данные генератором до каждого масштаба):
+    DATABASE_URL=postgresql://localhost/cycle_bench python benchmarks/explain_queries.py \
+        --scales 10000,1000000,10000000 --today 2026-01-01
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+import jwt
+import psycopg2
+
+import generate_dataset
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEQ_SCAN_ROWS = 10000
+
+
+class RecordingCursor:
+    def __init__(self, cur, log: list):
+        self._cur = cur
+        self._log = log
+
+    def execute(self, sql, params=None):
+        self._log.append(self._cur.mogrify(sql, params).decode())
+        return self._cur.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class RecordingConnection:
+    def __init__(self, conn, log: list):
+        self._conn = conn
+        self._log = log
+
+    def cursor(self):
+        return RecordingCursor(self._conn.cursor(), self._log)
+
+    def commit(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class RecordingPsycopg2:
+    def __init__(self, conn, log: list):
+        self._conn = conn
+        self._log = log
+
+    def connect(self, *args, **kwargs) -> RecordingConnection:
+        return RecordingConnection(self._conn, self._log)
+
+    def __getattr__(self, name):
+        return getattr(psycopg2, name)
+
+
+def load_handler(name: str):
+    spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(ROOT, 'backend', name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_token(user_id: int) -> str:
+    payload = {'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, os.environ.get('JWT_SECRET', 'default-secret-key'), algorithm='HS256')
+
+
+def pick(cur, sql: str):
+    cur.execute(sql)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def scenarios(cur, rng: random.Random, today: date) -> list:
+    """Типичные вызовы функций для случайных пользователей с нужными данными"""
+    cur.execute("SELECT MAX(id) FROM users")
+    max_user = cur.fetchone()[0]
+    user_id = pick(cur, f"SELECT user_id FROM cycles WHERE user_id >= {rng.randint(1, max_user)} ORDER BY user_id LIMIT 1")
+    cur.execute("SELECT id, user_id FROM medications WHERE id >= %s ORDER BY id LIMIT 1", (rng.randint(1, max_user),))
+    medication = cur.fetchone()
+    pregnant_user = pick(cur, "SELECT user_id FROM pregnancies ORDER BY id DESC LIMIT 1")
+    post_id = pick(cur, "SELECT id FROM community_posts WHERE category = 'general' ORDER BY created_at DESC LIMIT 1")
+    today = today.isoformat()
+
+    def get(params: dict, uid: int = None) -> dict:
+        return {'httpMethod': 'GET', 'headers': {'Authorization': f'Bearer {make_token(uid or user_id)}'},
+                'queryStringParameters': params}
+
+    def post(body: dict, uid: int = None) -> dict:
+        return {'httpMethod': 'POST', 'headers': {'Authorization': f'Bearer {make_token(uid or user_id)}'},
+                'body': json.dumps(body)}
+
+    items = [
+        ('cycles', 'list', get({'limit': '12'})),
+        ('cycles', 'create', post({'startDate': today, 'endDate': today})),
+        ('tracking', 'day', get({'date': today})),
+        ('tracking', 'range 90', get({'date': today, 'range': '90'})),
+        ('tracking', 'trends 5y', get({'mode': 'trends', 'range': '1825', 'bucket': 'week'})),
+        ('tracking', 'save', post({'date': today, 'mood': 3, 'symptoms': [{'type': 'headache', 'severity': 2}]})),
+        ('search', 'notes', get({'q': 'голова болит'})),
+        ('analytics', 'cycle length', get({'metric': 'cycle_length', 'ageBand': '25-29'})),
+        ('analytics', 'symptoms', get({'metric': 'symptoms'})),
+        ('community', 'feed', get({'category': 'general'})),
+        ('medications', 'list', get({'days': '30'}))
+    ]
+    if post_id:
+        items += [
+            ('community', 'post', get({'postId': str(post_id)})),
+            ('community', 'like', post({'action': 'like', 'postId': post_id}))
+        ]
+    if medication:
+        items += [
+            ('medications', 'chart 90', get({'medicationId': str(medication[0]), 'days': '90'}, medication[1])),
+            ('medications', 'log', post({'action': 'log', 'medicationId': medication[0]}, medication[1]))
+        ]
+    if pregnant_user:
+        items.append(('pregnancy', 'timeline', get({}, pregnant_user)))
+
+    # Одна пачка вместо sweep(): после отката те же строки забирались бы снова
+    items += [
+        ('reminders', 'appointments', lambda m, c: m.send_appointment_batch(c, lambda message: None, [])),
+        ('reminders', 'medications', lambda m, c: m.send_medication_batch(c, lambda message: None, []))
+    ]
+    return items
+
+
+def record(modules: dict, conn, function: str, event) -> tuple:
+    """
+    Запросы одного вызова функции и текст ошибки (None, если вызов успешен);
+    event может быть функцией от модуля
+    """
+    log = []
+    module = modules[function]
+    module.psycopg2 = RecordingPsycopg2(conn, log)
+    try:
+        if callable(event):
+            event(module, RecordingConnection(conn, log))
+            return log, None
+        response = module.handler(event, None)
+    except Exception as e:
+        conn.rollback()
+        return log, str(e)
+    if response['statusCode'] >= 500:
+        return log, f'{response["statusCode"]} {response["body"]}'
+    return log, None
+
+
+def explainable(sql: str) -> str:
+    """Запрос в виде, пригодном для EXPLAIN; None для служебных команд"""
+    sql = sql.strip()
+    head = sql.split(None, 1)[0].upper()
+    if head in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'EXECUTE'):
+        return sql
+    return None
+
+
+def walk(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def explain(cur, sql: str) -> dict:
+    try:
+        cur.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql)
+        result = cur.fetchone()[0][0]
+    finally:
+        cur.connection.rollback()
+
+    plan = result['Plan']
+    seq_scans = []
+    for node in walk(plan):
+        if node['Node Type'] == 'Seq Scan':
+            scanned = node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)
+            if scanned >= SEQ_SCAN_ROWS:
+                seq_scans.append(f"{node['Relation Name']}({scanned})")
+
+    return {
+        'ms': result['Execution Time'],
+        'hit': plan.get('Shared Hit Blocks', 0),
+        'read': plan.get('Shared Read Blocks', 0),
+        'seqScans': seq_scans
+    }
+
+
+def run_scale(conn, modules: dict, rng: random.Random, today: date) -> tuple:
+    """Число запросов с Seq Scan и число упавших сценариев на текущем объеме"""
+    cur = conn.cursor()
+    items = scenarios(cur, rng, today)
+    conn.rollback()
+
+    flagged = 0
+    failed = 0
+    for function, label, event in items:
+        log, error = record(modules, conn, function, event)
+        if error:
+            failed += 1
+            print(f'{function:<12} {label:<13} FAILED {error}')
+            continue
+        for sql in log:
+            statement = explainable(sql)
+            if not statement:
+                continue
+            try:
+                result = explain(cur, statement)
+            except psycopg2.Error as e:
+                print(f'{function:<12} {label:<13} ERROR {str(e).strip()}')
+                continue
+            flag = 'SEQ SCAN ' + ', '.join(result['seqScans']) if result['seqScans'] else ''
+            flagged += bool(flag)
+            summary = ' '.join(statement.split())[:70]
+            print(f'{function:<12} {label:<13} {result["ms"]:>9.2f}ms hit={result["hit"]:<7} '
+                  f'read={result["read"]:<7} {summary} {flag}')
+    cur.close()
+    return flagged, failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default='10000,1000000,10000000')
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=36)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--today', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--no-generate', action='store_true')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    if not args.no_generate:
+        generate_dataset.apply_migrations(conn)
+
+    modules = {name: load_handler(name) for name in
+               ('cycles', 'tracking', 'search', 'analytics', 'community', 'medications', 'pregnancy', 'reminders')}
+
+    flagged = 0
+    failed = 0
+    for scale in [int(s) for s in args.scales.split(',')]:
+        if not args.no_generate:
+            generate_dataset.generate(conn, scale, args.years, args.seed, args.jobs, args.today)
+        print(f'\n=== {scale} users ===')
+        scale_flagged, scale_failed = run_scale(conn, modules, random.Random(args.seed), args.today)
+        flagged += scale_flagged
+        failed += scale_failed
+
+    conn.close()
+    print(f'\n{flagged} statements with sequential scans over >= {SEQ_SCAN_ROWS} rows, {failed} failed scenarios')
+    return 1 if flagged or failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+"""
+Детерминированный генератор синтетических данных для локального Postgres.
+
+Применяет новые миграции из db_migrations по порядку и дозаливает пользователей
+с историей циклов, ежедневными записями, симптомами, лекарствами, визитами,
+беременностями, дневником и постами сообщества. Данные грузятся через COPY
+пачками пользователей. Каждый пользователь генерируется из собственного
+seed: его даты, значения и тексты зависят только от --seed, номера
+пользователя и --today, но не от --jobs, размера пачки или того, за
+сколько запусков набран объем. Первичные ключи отсчитываются от MAX(id)
+таблиц на момент запуска и совпадают только при одинаковом исходном
+состоянии базы.
+
+Запуск:
+    DATABASE_URL=postgresql://localhost/cycle_bench python benchmarks/generate_dataset.py \
+        --users 10000 --years 3 --today 2026-01-01
+"""
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import random
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHUNK_USERS = 5000
+NULL = '\\N'
+
+TIMEZONES = ['Europe/Moscow'] * 6 + ['Asia/Yekaterinburg', 'Asia/Novosibirsk', 'Europe/Kaliningrad', 'Asia/Vladivostok']
+SYMPTOMS = ['headache', 'cramps', 'bloating', 'acne', 'fatigue', 'nausea', 'back_pain', 'breast_tenderness', 'cravings', 'insomnia']
+NOTE_WORDS = ['сегодня', 'болит', 'голова', 'живот', 'устала', 'спала', 'плохо', 'хорошо', 'тренировка', 'кофе',
+              'стресс', 'работа', 'настроение', 'прогулка', 'ибупрофен', 'врач', 'отпуск', 'сладкое', 'тошнота', 'сон']
+SPECIALISTS = ['gynecologist', 'endocrinologist', 'therapist', 'ultrasound', 'mammologist']
+CATEGORIES = ['general', 'pregnancy', 'pms', 'contraception', 'health', 'fertility']
+MEDICATIONS = [
+    ('Ярина', 'contraception', '1 таблетка', 'daily'),
+    ('Джес', 'contraception', '1 таблетка', 'daily'),
+    ('Магне B6', 'supplement', '2 таблетки', 'twice_daily'),
+    ('Фолиевая кислота', 'supplement', '400 мкг', 'daily'),
+    ('Витамин D', 'supplement', '2000 МЕ', 'daily'),
+    ('Дюфастон', 'hormone', '10 мг', 'twice_daily')
+]
+
+TABLES = {
+    'users': 'id, email, name, provider, created_at',
+    'user_profiles': 'user_id, average_cycle_length, average_period_length, date_of_birth, weight, height, timezone',
+    'user_settings': 'user_id, language, data_sharing, reminders_medication, reminders_appointments',
+    'cycles': 'user_id, start_date, end_date, cycle_length, period_length, notes, created_at',
+    'daily_logs': ('user_id, log_date, mood, pain_level, flow_intensity, energy_level, sleep_hours, '
+                   'water_glasses, exercise_minutes, calories_intake, weight, temperature, notes'),
+    'symptoms': 'user_id, log_date, symptom_type, severity, notes',
+    'medications': 'id, user_id, name, type, dosage, frequency, start_date, reminder_time, active',
+    'medication_logs': 'medication_id, taken_at, skipped',
+    'medication_adherence_daily': 'medication_id, log_date, taken_count, skipped_count',
+    'appointments': 'user_id, specialist_type, appointment_date, location, status, reminder_sent',
+    'pregnancies': 'id, user_id, conception_date, due_date, status',
+    'pregnancy_events': 'pregnancy_id, event_date, event_type, title',
+    'diary_entries': 'user_id, entry_date, title, content, mood',
+    'community_posts': 'user_id, category, title, content, likes_count, replies_count, is_anonymous, created_at'
+}
+
+
+def apply_migrations(conn) -> None:
+    """
+    Применяет еще не примененные db_migrations/V*.sql по номеру версии.
+    Миграции не идемпотентны (V0009 очищает статистику когорт), поэтому
+    примененные версии хранятся в bench_migrations и повторно не запускаются.
+    """
+    def version(path: str) -> int:
+        return int(re.match(r'V(\d+)__', os.path.basename(path)).group(1))
+
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bench_migrations (
+            version INTEGER PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT version FROM bench_migrations")
+    applied = {row[0] for row in cur.fetchall()}
+    conn.commit()
+
+    for path in sorted(glob.glob(os.path.join(ROOT, 'db_migrations', 'V*.sql')), key=version):
+        if version(path) in applied:
+            continue
+        with open(path, encoding='utf-8') as f:
+            cur.execute(f.read())
+        cur.execute("INSERT INTO bench_migrations (version) VALUES (%s)", (version(path),))
+        conn.commit()
+    cur.close()
+
+
+def clipped_gauss(rng: random.Random, mu: float, sigma: float, low: float, high: float) -> float:
+    return min(max(rng.gauss(mu, sigma), low), high)
+
+
+def note(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choices(NOTE_WORDS, k=words))
+
+
+def value(v) -> str:
+    if v is None:
+        return NULL
+    if isinstance(v, bool):
+        return 't' if v else 'f'
+    return str(v).replace('\\', '\\\\').replace('\t', ' ').replace('\n', ' ')
+
+
+def generate_user(rng: random.Random, index: int, ids: dict, years: int, today: date, out: dict) -> None:
+    """
+    Один пользователь со всей историей. ids содержит явные id пользователя,
+    его лекарств (не больше двух) и беременности: строки других таблиц
+    ссылаются на них, а пачки генерируются независимо.
+    """
+    def emit(table: str, *row) -> None:
+        out[table].write('\t'.join(value(v) for v in row) + '\n')
+
+    user_id = ids['user']
+    now = datetime.combine(today, datetime.min.time()) + timedelta(hours=12)
+    joined = datetime.combine(today - timedelta(days=int(years * 365 + rng.randrange(30))), datetime.min.time())
+    emit('users', user_id, f'synthetic-{index}@example.com', f'User {index}', rng.choice(['google', 'yandex']), joined)
+
+    avg_cycle = round(clipped_gauss(rng, 28.5, 3.0, 21, 40))
+    avg_period = round(clipped_gauss(rng, 5.0, 1.0, 2, 8))
+    age = rng.randint(16, 50)
+    dob = today - timedelta(days=age * 365 + rng.randrange(365))
+    weight = round(clipped_gauss(rng, 63, 9, 42, 120), 2)
+    emit('user_profiles', user_id, avg_cycle, avg_period, dob, weight, rng.randint(150, 185), rng.choice(TIMEZONES))
+    emit('user_settings', user_id, 'ru' if rng.random() < 0.85 else 'en', rng.random() < 0.3,
+         rng.random() < 0.9, rng.random() < 0.9)
+
+    adherence = rng.betavariate(2, 2)
+    pregnant = age < 42 and rng.random() < 0.02
+    start = joined.date()
+    end = today if not pregnant else today - timedelta(days=rng.randint(30, 250))
+
+    period_days = set()
+    previous = None
+    day = start
+    while day <= end:
+        period = round(clipped_gauss(rng, avg_period, 1.0, 2, 9))
+        period_end = day + timedelta(days=period - 1)
+        emit('cycles', user_id, day, period_end if period_end <= today else None,
+             (day - previous).days if previous else None, period,
+             note(rng, rng.randint(2, 8)) if rng.random() < 0.1 else None,
+             datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.randint(7, 23)))
+        for offset in range(period):
+            period_days.add(day + timedelta(days=offset))
+        previous = day
+        day += timedelta(days=round(clipped_gauss(rng, avg_cycle, 2.5, 20, 45)))
+
+    day = start
+    while day <= today:
+        if rng.random() < adherence:
+            flow = rng.choice([1, 2, 2, 3]) if day in period_days else 0
+            pain = rng.randint(2, 8) if day in period_days else rng.choice([0, 0, 0, 1, 2])
+            temperature = round(rng.gauss(36.6, 0.2), 2) if rng.random() < 0.2 else None
+            emit('daily_logs', user_id, day, rng.randint(0, 4), pain, flow, rng.randint(2, 10),
+                 round(clipped_gauss(rng, 7.2, 1.1, 3, 12), 1), rng.randint(2, 12),
+                 rng.choice([None, 0, 20, 30, 45, 60]), rng.choice([None, rng.randint(1300, 2800)]),
+                 round(weight + rng.gauss(0, 0.8), 2) if rng.random() < 0.3 else None, temperature,
+                 note(rng, rng.randint(3, 15)) if rng.random() < 0.15 else None)
+            symptom_chance = 0.6 if day in period_days else 0.12
+            if rng.random() < symptom_chance:
+                for symptom in rng.sample(SYMPTOMS, rng.randint(1, 3)):
+                    emit('symptoms', user_id, day, symptom, rng.randint(1, 5),
+                         note(rng, 4) if rng.random() < 0.1 else None)
+        day += timedelta(days=1)
+
+    if rng.random() < 0.3:
+        chosen = rng.sample(MEDICATIONS, rng.randint(1, 2))
+        for medication_id, (name, kind, dosage, frequency) in zip(ids['medications'], chosen):
+            med_start = today - timedelta(days=rng.randint(10, int(years * 365)))
+            emit('medications', medication_id, user_id, name, kind, dosage, frequency, med_start,
+                 f'{rng.randint(7, 22):02d}:{rng.choice([0, 15, 30, 45]):02d}:00', True)
+            doses = 2 if frequency == 'twice_daily' else 1
+            take_rate = clipped_gauss(rng, 0.85, 0.1, 0.3, 1.0)
+            day = med_start
+            while day <= today:
+                taken = skipped = 0
+                for dose in range(doses):
+                    roll = rng.random()
+                    if roll < take_rate:
+                        taken += 1
+                    elif roll < take_rate + 0.05:
+                        skipped += 1
+                    else:
+                        continue
+                    moment = datetime.combine(day, datetime.min.time()) + timedelta(hours=8 + dose * 12, minutes=rng.randrange(60))
+                    emit('medication_logs', medication_id, moment, roll >= take_rate)
+                if taken or skipped:
+                    emit('medication_adherence_daily', medication_id, day, taken, skipped)
+                day += timedelta(days=1)
+
+    if rng.random() < 0.25:
+        for _ in range(rng.randint(1, 4)):
+            moment = datetime.combine(today, datetime.min.time()) + timedelta(days=rng.randint(-365, 60), hours=rng.randint(9, 18))
+            emit('appointments', user_id, rng.choice(SPECIALISTS), moment, 'Клиника', 'scheduled', moment < now)
+
+    if pregnant:
+        pregnancy_id = ids['pregnancy']
+        conception = end + timedelta(days=14)
+        emit('pregnancies', pregnancy_id, user_id, conception, conception + timedelta(days=266), 'active')
+        for week in (8, 12, 20, 24, 31):
+            event_day = conception + timedelta(weeks=week - 2)
+            if event_day <= today + timedelta(days=60):
+                emit('pregnancy_events', pregnancy_id, event_day, 'checkup', f'Визит, {week} неделя')
+
+    for _ in range(int(rng.expovariate(1 / 3))):
+        emit('diary_entries', user_id, today - timedelta(days=rng.randrange(int(years * 365))),
+             note(rng, 3), note(rng, rng.randint(15, 80)), rng.randint(0, 4))
+
+    if rng.random() < 0.1:
+        for _ in range(rng.randint(1, 3)):
+            posted = now - timedelta(minutes=rng.randrange(int(years * 525600)))
+            emit('community_posts', user_id, rng.choice(CATEGORIES), note(rng, 6), note(rng, rng.randint(20, 120)),
+                 int(rng.paretovariate(1.2)) - 1, rng.randint(0, 20), rng.random() < 0.3, posted)
+
+
+def generate_chunk(task: tuple) -> dict:
+    """Строки COPY для пользователей [first, last) пачки, по таблицам"""
+    seed, years, today, bases, existing, first, last = task
+    out = {table: io.StringIO() for table in TABLES}
+
+    for index in range(first, last):
+        offset = index - existing
+        ids = {
+            'user': bases['users'] + offset,
+            'medications': (bases['medications'] + offset * 2, bases['medications'] + offset * 2 + 1),
+            'pregnancy': bases['pregnancies'] + offset
+        }
+        generate_user(random.Random(f'{seed}:{index}'), index, ids, years, today, out)
+
+    return {table: buffer.getvalue() for table, buffer in out.items()}
+
+
+def generate(conn, users: int, years: int, seed: int, jobs: int = 1, today: date = None) -> int:
+    """
+    Дозаливает пользователей до общего числа users; возвращает число добавленных.
+    Истории заканчиваются в today (по умолчанию сегодня).
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM users WHERE email LIKE 'synthetic-%'")
+    existing = cur.fetchone()[0]
+    if existing >= users:
+        cur.close()
+        return 0
+
+    bases = {}
+    for table in ('users', 'medications', 'pregnancies'):
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+        bases[table] = cur.fetchone()[0]
+
+    today = today or date.today()
+    started = time.perf_counter()
+    tasks = [(seed, years, today, bases, existing, first, min(first + CHUNK_USERS, users))
+             for first in range(existing, users, CHUNK_USERS)]
+
+    with multiprocessing.Pool(jobs) as pool:
+        for task, chunk in zip(tasks, pool.imap(generate_chunk, tasks)):
+            for table, columns in TABLES.items():
+                if chunk[table]:
+                    cur.copy_expert(f'COPY {table} ({columns}) FROM STDIN', io.StringIO(chunk[table]))
+            conn.commit()
+            print(f'{task[-1]}/{users} users, {time.perf_counter() - started:.0f}s', file=sys.stderr)
+
+    for table in ('users', 'medications', 'pregnancies'):
+        cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+    conn.commit()
+
+    old_isolation = conn.isolation_level
+    conn.set_isolation_level(0)
+    for table in TABLES:
+        cur.execute(f'VACUUM ANALYZE {table}')
+    conn.set_isolation_level(old_isolation)
+
+    cur.close()
+    return users - existing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=36)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--today', type=date.fromisoformat, default=date.today())
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    apply_migrations(conn)
+    added = generate(conn, args.users, args.years, args.seed, args.jobs, args.today)
+    print(f'added {added} users')
+    conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Поиск по заметкам на миллионах синтетических записей: GIN + tsvector против ILIKE.
+
+Заполняет diary_entries и daily_logs.notes через COPY, затем для выборки
+пользователей сравнивает запрос функции search с наивным ILIKE '%...%',
+который делает ту же работу: все четыре источника, все слова запроса
+(с исключением слов через '-'), подсветка совпадений и страница
+PAGE_SIZE + 1 строк, упорядоченная по дате.
+
+Запуск:
+    DATABASE_URL=postgresql://localhost/cycle_bench python benchmarks/notes_search.py \
+        --users 2000 --entries 2000000
+"""
+import argparse
+import importlib.util
+import io
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = [
+    'головная', 'боль', 'судороги', 'усталость', 'тошнота', 'сон', 'бессонница', 'настроение',
+    'тревога', 'спорт', 'бег', 'йога', 'вода', 'кофе', 'стресс', 'работа', 'отпуск', 'врач',
+    'таблетка', 'ибупрофен', 'вздутие', 'аппетит', 'сладкое', 'прогулка', 'температура',
+    'headache', 'cramps', 'tired', 'running', 'coffee', 'doctor', 'bloating', 'anxiety',
+    'сегодня', 'вчера', 'утром', 'вечером', 'немного', 'сильно', 'лучше', 'хуже'
+]
+
+QUERIES = ['головная боль', 'судороги', 'бессонница', 'doctor', 'вздутие живота', 'тревога -кофе']
+
+COPY_CHUNK = 100000
+
+
+def load_handler(name: str):
+    spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(ROOT, 'backend', name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def copy_rows(cur, table: str, columns: str, rows) -> None:
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write('\t'.join(row) + '\n')
+        count += 1
+        if count % COPY_CHUNK == 0:
+            buffer.seek(0)
+            cur.copy_expert(f'COPY {table} ({columns}) FROM STDIN', buffer)
+            buffer = io.StringIO()
+    buffer.seek(0)
+    cur.copy_expert(f'COPY {table} ({columns}) FROM STDIN', buffer)
+
+
+def generate(conn, users: int, entries: int, seed: int) -> list:
+    rng = random.Random(seed)
+    cur = conn.cursor()
+
+    cur.execute("""
+        INSERT INTO users (email, name)
+        SELECT 'bench-search-' || g || '@example.com', 'bench ' || g
+        FROM generate_series(1, %s) g
+        ON CONFLICT (email) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+    """, (users,))
+    user_ids = [r[0] for r in cur.fetchall()]
+
+    today = date.today()
+
+    def diary():
+        for _ in range(entries):
+            text = ' '.join(rng.choices(WORDS, k=rng.randint(10, 60)))
+            day = today - timedelta(days=rng.randrange(3650))
+            yield str(rng.choice(user_ids)), day.isoformat(), 'Запись', text
+
+    def logs():
+        per_user = max(1, entries // (4 * len(user_ids)))
+        for user_id in user_ids:
+            for offset in range(per_user):
+                text = ' '.join(rng.choices(WORDS, k=rng.randint(3, 15)))
+                yield str(user_id), (today - timedelta(days=offset)).isoformat(), text
+
+    start = time.perf_counter()
+    copy_rows(cur, 'diary_entries', 'user_id, entry_date, title, content', diary())
+    cur.execute("DELETE FROM daily_logs WHERE user_id = ANY(%s)", (user_ids,))
+    copy_rows(cur, 'daily_logs', 'user_id, log_date, notes', logs())
+    conn.commit()
+    cur.execute("ANALYZE diary_entries")
+    cur.execute("ANALYZE daily_logs")
+    conn.commit()
+    print(f'loaded {entries} diary entries in {time.perf_counter() - start:.1f}s')
+
+    cur.close()
+    return user_ids
+
+
+ILIKE_SOURCES = [
+    ('diary', 'id', 'entry_date', 'title', "COALESCE(title, '') || ' ' || content", 'diary_entries'),
+    ('log', 'id', 'log_date', 'NULL', "COALESCE(notes, '')", 'daily_logs'),
+    ('cycle', 'id', 'start_date', 'NULL', "COALESCE(notes, '')", 'cycles'),
+    ('symptom', 'id', 'log_date', 'symptom_type', "symptom_type || ' ' || COALESCE(notes, '')", 'symptoms')
+]
+
+
+def ilike_sql(query: str, user_id: int, limit: int) -> tuple:
+    """Эквивалент запроса search_first на ILIKE: каждое слово обязательно, '-слово' исключает"""
+    include = [w for w in query.split() if not w.startswith('-')]
+    exclude = [w[1:] for w in query.split() if w.startswith('-') and len(w) > 1]
+
+    parts = []
+    params = []
+    for source, id_col, date_col, title_col, text, table in ILIKE_SOURCES:
+        conditions = [f'{text} ILIKE %s' for _ in include] + [f'{text} NOT ILIKE %s' for _ in exclude]
+        parts.append(f"""
+            SELECT '{source}' AS source, {id_col} AS id, {date_col} AS entry_date, {title_col} AS title,
+                   {text} AS body
+            FROM {table}
+            WHERE user_id = %s AND {' AND '.join(conditions)}
+        """)
+        params += [user_id] + ['%' + w + '%' for w in include] + ['%' + w + '%' for w in exclude]
+
+    sql = f"""
+        SELECT source, id, entry_date, title, regexp_replace(body, %s, '<b>\\&</b>', 'gi')
+        FROM ({' UNION ALL '.join(parts)}) hits
+        ORDER BY entry_date DESC, source DESC, id DESC
+        LIMIT %s
+    """
+    return sql, ['|'.join(include)] + params + [limit]
+
+
+def measure(cur, run) -> float:
+    start = time.perf_counter()
+    run()
+    cur.fetchall()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--entries', type=int, default=2000000)
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=28)
+    args = parser.parse_args()
+
+    search = load_handler('search')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    user_ids = generate(conn, args.users, args.entries, args.seed)
+    sample = random.Random(args.seed).sample(user_ids, min(args.samples, len(user_ids)))
+
+    cur = conn.cursor()
+    limit = search.PAGE_SIZE + 1
+
+    for query in QUERIES:
+        fts = [measure(cur, lambda: search.execute_statement(cur, 'search_first', (query, u, limit))) for u in sample]
+        ilike = [measure(cur, lambda: cur.execute(*ilike_sql(query, u, limit))) for u in sample]
+        print(f'{query:<20} fts p50={statistics.median(fts) * 1000:>8.2f}ms '
+              f'ilike p50={statistics.median(ilike) * 1000:>8.2f}ms')
+
+    cur.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
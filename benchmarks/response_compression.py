@@ -0,0 +1,82 @@
+"""
+Размер ответа на проводе и CPU на сжатие для get_daily_log?range=N.
+
+Строит синтетические строки daily_logs той же формы, что отдает tracking,
+и прогоняет их через json_response функции с разными Accept-Encoding
+и раскладками (объекты / columnar). База данных не нужна.
+
+Запуск:
+    python benchmarks/response_compression.py --ranges 7,30,90,365,1825
+"""
+import argparse
+import base64
+import importlib.util
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPEAT = 50
+
+
+def load_handler(name: str):
+    spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(ROOT, 'backend', name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_logs(days: int, rng: random.Random) -> list:
+    today = date.today()
+    return [{
+        'date': (today - timedelta(days=i)).isoformat(),
+        'mood': rng.randint(0, 4),
+        'painLevel': rng.choice([None, 0, 1, 2, 5]),
+        'flowIntensity': rng.choice([None, 0, 1, 2, 3]),
+        'energyLevel': rng.randint(0, 10),
+        'sleepHours': round(rng.uniform(5, 9), 1),
+        'waterGlasses': rng.randint(2, 10),
+        'exerciseMinutes': rng.choice([None, 0, 20, 30, 45, 60]),
+        'caloriesIntake': rng.choice([None, rng.randint(1400, 2600)]),
+        'weight': round(rng.uniform(55, 60), 2)
+    } for i in range(days)]
+
+
+def measure(tracking, data: dict, accept: str) -> tuple:
+    event = {'headers': {'Accept-Encoding': accept}} if accept else None
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        response = tracking.json_response(data, event=event)
+    elapsed = (time.perf_counter() - start) / REPEAT
+    body = response['body']
+    size = len(base64.b64decode(body)) if response['isBase64Encoded'] else len(body.encode('utf-8'))
+    return size, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ranges', default='7,30,90,365,1825')
+    args = parser.parse_args()
+
+    tracking = load_handler('tracking')
+    rng = random.Random(31)
+    encodings = [('identity', ''), ('gzip', 'gzip')]
+    if tracking.brotli:
+        encodings.append(('br', 'br'))
+
+    print(f'{"range":>6} {"layout":<9} {"encoding":<9} {"bytes":>9} {"ratio":>6} {"cpu":>9}')
+    for days in [int(r) for r in args.ranges.split(',')]:
+        logs = synthetic_logs(days, rng)
+        baseline = None
+        for layout, data in (('objects', {'logs': logs}), ('columnar', {'logs': tracking.to_columnar(logs)})):
+            for label, accept in encodings:
+                size, elapsed = measure(tracking, data, accept)
+                baseline = baseline or size
+                print(f'{days:>6} {layout:<9} {label:<9} {size:>9} {size / baseline:>6.2f} {elapsed * 1e6:>7.0f}us')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
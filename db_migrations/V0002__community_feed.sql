@@ -0,0 +1,17 @@
+-- Keyset pagination for category feeds: (category, created_at, id)
+DROP INDEX IF EXISTS idx_community_posts_category;
+CREATE INDEX IF NOT EXISTS idx_community_posts_category_feed ON community_posts(category, created_at DESC, id DESC);
+
+-- Replies of a post in chronological order
+CREATE INDEX IF NOT EXISTS idx_community_replies_post ON community_replies(post_id, created_at, id);
+
+-- Pending counter increments, merged into community_posts in batches
+CREATE TABLE IF NOT EXISTS community_counter_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    post_id INTEGER REFERENCES community_posts(id),
+    likes_delta INTEGER DEFAULT 0,
+    replies_delta INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_community_counter_deltas_post ON community_counter_deltas(post_id);
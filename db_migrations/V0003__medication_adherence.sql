@@ -0,0 +1,22 @@
+-- Intake log lookups by medication and time
+CREATE INDEX IF NOT EXISTS idx_medication_logs_medication_taken ON medication_logs(medication_id, taken_at);
+
+-- Per-day intake summary, maintained on every intake write
+CREATE TABLE IF NOT EXISTS medication_adherence_daily (
+    medication_id INTEGER REFERENCES medications(id),
+    log_date DATE NOT NULL,
+    taken_count INTEGER DEFAULT 0,
+    skipped_count INTEGER DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (medication_id, log_date)
+);
+
+-- Backfill from the existing intake log
+INSERT INTO medication_adherence_daily (medication_id, log_date, taken_count, skipped_count)
+SELECT medication_id,
+       taken_at::date,
+       COUNT(*) FILTER (WHERE NOT COALESCE(skipped, false)),
+       COUNT(*) FILTER (WHERE COALESCE(skipped, false))
+FROM medication_logs
+GROUP BY medication_id, taken_at::date
+ON CONFLICT (medication_id, log_date) DO NOTHING;
@@ -0,0 +1,37 @@
+-- Full-text search over free-text notes (Russian and English stemming)
+--
+-- Adding a STORED generated column rewrites the whole table under an
+-- ACCESS EXCLUSIVE lock: diary_entries, daily_logs, cycles and symptoms are
+-- unreadable and unwritable until each ALTER finishes, and the GIN builds
+-- below block writes as well. On small databases this is seconds; on large
+-- ones (millions of daily_logs/symptoms rows) apply it in a maintenance
+-- window, or stage it by hand: add a plain tsvector column kept up to date
+-- by a trigger, backfill it in batches, then CREATE INDEX CONCURRENTLY.
+ALTER TABLE diary_entries ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('russian', COALESCE(title, '') || ' ' || content) ||
+        to_tsvector('english', COALESCE(title, '') || ' ' || content)
+    ) STORED;
+
+ALTER TABLE daily_logs ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('russian', COALESCE(notes, '')) ||
+        to_tsvector('english', COALESCE(notes, ''))
+    ) STORED;
+
+ALTER TABLE cycles ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('russian', COALESCE(notes, '')) ||
+        to_tsvector('english', COALESCE(notes, ''))
+    ) STORED;
+
+ALTER TABLE symptoms ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('russian', symptom_type || ' ' || COALESCE(notes, '')) ||
+        to_tsvector('english', symptom_type || ' ' || COALESCE(notes, ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_diary_entries_search ON diary_entries USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_daily_logs_search ON daily_logs USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_cycles_search ON cycles USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_symptoms_search ON symptoms USING GIN (search_vector);
@@ -0,0 +1,34 @@
+-- Population statistics for users with data_sharing enabled.
+-- Histograms are fixed 1-day buckets, so cohorts merge by summing counts.
+CREATE TABLE IF NOT EXISTS cohort_histograms (
+    age_band VARCHAR(20) NOT NULL,
+    metric VARCHAR(50) NOT NULL,
+    bucket INTEGER NOT NULL,
+    count BIGINT DEFAULT 0,
+    PRIMARY KEY (age_band, metric, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS cohort_symptom_counts (
+    age_band VARCHAR(20) NOT NULL,
+    symptom_type VARCHAR(100) NOT NULL,
+    phase VARCHAR(20) NOT NULL,
+    count BIGINT DEFAULT 0,
+    PRIMARY KEY (age_band, symptom_type, phase)
+);
+
+-- Distinct contributors per cohort, used to enforce minimum cohort size
+CREATE TABLE IF NOT EXISTS cohort_members (
+    age_band VARCHAR(20) NOT NULL,
+    user_id INTEGER REFERENCES users(id),
+    PRIMARY KEY (age_band, user_id)
+);
+
+-- Last ingested row id per source table
+CREATE TABLE IF NOT EXISTS analytics_watermarks (
+    source VARCHAR(50) PRIMARY KEY,
+    last_id BIGINT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO analytics_watermarks (source, last_id) VALUES ('cycles', 0), ('symptoms', 0)
+ON CONFLICT (source) DO NOTHING;
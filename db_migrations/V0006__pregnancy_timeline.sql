@@ -0,0 +1,3 @@
+-- Pregnancy timeline lookups
+CREATE INDEX IF NOT EXISTS idx_pregnancies_user ON pregnancies(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_pregnancy_events_pregnancy_date ON pregnancy_events(pregnancy_id, event_date);
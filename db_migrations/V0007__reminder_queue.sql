@@ -0,0 +1,13 @@
+-- Due appointment reminders: only unsent rows are indexed
+CREATE INDEX IF NOT EXISTS idx_appointments_reminder_due ON appointments(appointment_date) WHERE reminder_sent = false;
+
+-- Active medications with a daily reminder
+CREATE INDEX IF NOT EXISTS idx_medications_reminder_time ON medications(reminder_time) WHERE active AND reminder_time IS NOT NULL;
+
+-- Daily medication reminders already delivered (one per medication per local day)
+CREATE TABLE IF NOT EXISTS medication_reminders_sent (
+    medication_id INTEGER REFERENCES medications(id),
+    remind_on DATE NOT NULL,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (medication_id, remind_on)
+);
@@ -0,0 +1,7 @@
+-- One like per user per post; only newly inserted likes reach community_counter_deltas
+CREATE TABLE IF NOT EXISTS community_post_likes (
+    post_id INTEGER REFERENCES community_posts(id),
+    user_id INTEGER REFERENCES users(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (post_id, user_id)
+);
@@ -0,0 +1,49 @@
+-- Cohort statistics are rebuilt from per-row contributions: a changed cycle or
+-- day retracts what it contributed before and adds its current values, so
+-- edits (PUT /cycles, re-saved symptoms) never double count.
+-- Counts built by the append-only ingestion are discarded and re-ingested.
+
+-- What each cycle currently contributes to cohort_histograms
+CREATE TABLE IF NOT EXISTS cohort_cycle_contributions (
+    cycle_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    age_band VARCHAR(20) NOT NULL,
+    cycle_length INTEGER,
+    period_length INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_cohort_cycle_contributions_user ON cohort_cycle_contributions(user_id);
+
+-- What each logged day currently contributes to cohort_symptom_counts (a type counts once per day)
+CREATE TABLE IF NOT EXISTS cohort_symptom_contributions (
+    user_id INTEGER NOT NULL,
+    log_date DATE NOT NULL,
+    symptom_type VARCHAR(100) NOT NULL,
+    age_band VARCHAR(20) NOT NULL,
+    phase VARCHAR(20) NOT NULL,
+    PRIMARY KEY (user_id, log_date, symptom_type)
+);
+
+TRUNCATE cohort_histograms, cohort_symptom_counts, cohort_cycle_contributions, cohort_symptom_contributions;
+DROP TABLE IF EXISTS cohort_members;
+
+-- Distinct contributors per metric and cohort, used to enforce minimum cohort size
+CREATE TABLE IF NOT EXISTS cohort_members (
+    metric VARCHAR(50) NOT NULL,
+    age_band VARCHAR(20) NOT NULL,
+    user_id INTEGER REFERENCES users(id),
+    PRIMARY KEY (metric, age_band, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cohort_members_user ON cohort_members(user_id);
+
+-- Watermarks follow (updated_at, id) so edited rows are picked up again
+ALTER TABLE analytics_watermarks ADD COLUMN IF NOT EXISTS last_updated_at TIMESTAMP DEFAULT '1970-01-01';
+
+DELETE FROM analytics_watermarks WHERE source = 'symptoms';
+UPDATE analytics_watermarks SET last_id = 0, last_updated_at = '1970-01-01';
+INSERT INTO analytics_watermarks (source, last_id, last_updated_at) VALUES ('cycles', 0, '1970-01-01'), ('daily_logs', 0, '1970-01-01')
+ON CONFLICT (source) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS idx_cycles_updated ON cycles(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_daily_logs_updated ON daily_logs(updated_at, id);
@@ -0,0 +1,7 @@
+-- Turning data_sharing off retracts everything the user contributed to cohort
+-- statistics; user_settings is scanned by (updated_at, id) like cycles and days,
+-- so whatever writes data_sharing must also set updated_at = NOW().
+INSERT INTO analytics_watermarks (source, last_id, last_updated_at) VALUES ('user_settings', 0, '1970-01-01')
+ON CONFLICT (source) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS idx_user_settings_updated ON user_settings(updated_at, id);
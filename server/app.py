@@ -0,0 +1,341 @@
+"""
+ASGI-сервер для self-hosted установок: все функции из backend/ за одним
+долгоживущим процессом.
+
+HTTP-запрос переводится в event облачной функции, handler выполняется в пуле
+потоков, а psycopg2.connect внутри handler'ов отдает соединения из общего пула
+вместо нового подключения на каждый запрос. SQL функций не меняется.
+Handler'ы выполняются параллельно в нескольких потоках, поэтому общее
+состояние модулей (кэши, счетчики, реестр подготовленных запросов)
+изменяется только под блокировками.
+
+/_stats отдает статистику запросов только с заголовком X-Stats-Key,
+совпадающим с SERVER_STATS_KEY; без этой переменной путь отключен.
+
+Запуск (процесс на ядро):
+    DATABASE_URL=postgresql://... python server/app.py --workers 4 --port 8000
+"""
+import argparse
+import asyncio
+import base64
+import hmac
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FUNCTIONS = ('auth', 'cycles', 'tracking', 'community', 'medications', 'search', 'analytics', 'pregnancy')
+
+POOL_SIZE = int(os.environ.get('SERVER_DB_POOL_SIZE', '10'))
+MAX_QUEUE = int(os.environ.get('SERVER_MAX_QUEUE', '100'))
+MAX_BODY_BYTES = 1024 * 1024
+SHUTDOWN_TIMEOUT = 30
+
+
+class PooledConnection:
+    """Соединение из пула: close() откатывает незавершенную транзакцию и возвращает его в пул"""
+
+    def __init__(self, pool: 'ConnectionPool', conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class ConnectionPool:
+    """Потокобезопасный пул; блокирует вызывающий поток, пока соединение не освободится"""
+
+    def __init__(self, dsn: str, size: int):
+        self._pool = psycopg2.pool.ThreadedConnectionPool(1, size, dsn)
+        self._slots = threading.BoundedSemaphore(size)
+
+    def connect(self, *args, **kwargs) -> PooledConnection:
+        self._slots.acquire()
+        try:
+            return PooledConnection(self, self._pool.getconn())
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn) -> None:
+        try:
+            broken = conn.closed != 0
+            if not broken and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self._pool.putconn(conn, close=broken)
+        except psycopg2.Error:
+            self._pool.putconn(conn, close=True)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+
+class PooledPsycopg2:
+    """Подменяет модуль psycopg2 внутри handler'а: connect() берет соединение из пула"""
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+
+    def connect(self, *args, **kwargs) -> PooledConnection:
+        return self._pool.connect()
+
+    def __getattr__(self, name):
+        return getattr(psycopg2, name)
+
+
+class Context:
+    def __init__(self, function_name: str):
+        self.request_id = str(uuid.uuid4())
+        self.function_name = function_name
+
+
+def load_function(name: str):
+    spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(ROOT, 'backend', name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Server:
+    def __init__(self):
+        self.functions = {}
+        self.pool = None
+        self.executor = None
+        self.in_flight = 0
+        self.draining = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def startup(self) -> None:
+        self.pool = ConnectionPool(os.environ['DATABASE_URL'], POOL_SIZE)
+        self.executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='handler')
+        shim = PooledPsycopg2(self.pool)
+
+        for name in FUNCTIONS:
+            if not os.path.exists(os.path.join(ROOT, 'backend', name, 'index.py')):
+                continue
+            module = load_function(name)
+            module.psycopg2 = shim
+            self.functions[name] = module
+
+    async def shutdown(self) -> None:
+        """Перестает принимать запросы и ждет завершения уже начатых"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self.idle.wait(), SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+    def stats_response(self) -> dict:
+        """Статистика подготовленных запросов всех функций в этом процессе"""
+        stats = {name: module.statement_stats() for name, module in self.functions.items()
+                 if hasattr(module, 'statement_stats')}
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'pid': os.getpid(), 'statements': stats}),
+            'isBase64Encoded': False
+        }
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send) -> None:
+        segments = scope['path'].strip('/').split('/', 1)
+        name = segments[0]
+
+        if name == 'healthz':
+            await send_response(send, {'statusCode': 200, 'headers': {}, 'body': 'ok'})
+            return
+
+        if name == '_stats':
+            if not is_stats_authorized(scope):
+                await send_response(send, error_response('Not found', 404))
+                return
+            await send_response(send, self.stats_response())
+            return
+
+        module = self.functions.get(name)
+        if module is None:
+            await send_response(send, error_response('Not found', 404))
+            return
+
+        if self.draining:
+            await send_response(send, error_response('Shutting down', 503))
+            return
+
+        if self.in_flight >= POOL_SIZE + MAX_QUEUE:
+            response = error_response('Server busy', 503)
+            response['headers']['Retry-After'] = '1'
+            await send_response(send, response)
+            return
+
+        # Место занимается до чтения тела: иначе все запросы, ждущие тело,
+        # проходят проверку выше одновременно
+        self.in_flight += 1
+        self.idle.clear()
+        try:
+            body = await read_body(receive)
+            if body is None:
+                response = error_response('Request body too large', 413)
+            else:
+                event = build_event(scope, body, '/' + (segments[1] if len(segments) > 1 else ''))
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(self.executor, module.handler, event, Context(name))
+        except Exception as e:
+            response = error_response(str(e), 500)
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.idle.set()
+
+        await send_response(send, response)
+
+
+def is_stats_authorized(scope: dict) -> bool:
+    """Доступ к /_stats по ключу SERVER_STATS_KEY"""
+    expected = os.environ.get('SERVER_STATS_KEY')
+    provided = dict(scope.get('headers', [])).get(b'x-stats-key', b'').decode('latin-1')
+    return bool(expected) and hmac.compare_digest(provided, expected)
+
+
+async def read_body(receive) -> bytes:
+    """Читает тело запроса; None, если оно превышает MAX_BODY_BYTES"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def build_event(scope: dict, body: bytes, path: str) -> dict:
+    """HTTP-запрос в формате event облачной функции"""
+    headers = {}
+    for key, value in scope['headers']:
+        headers[key.decode('latin-1').lower()] = value.decode('latin-1')
+
+    query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+
+    try:
+        text = body.decode('utf-8')
+        is_base64 = False
+    except UnicodeDecodeError:
+        text = base64.b64encode(body).decode()
+        is_base64 = True
+
+    client = scope.get('client') or ('', 0)
+
+    return {
+        'httpMethod': scope['method'],
+        'headers': headers,
+        'queryStringParameters': query,
+        'body': text,
+        'isBase64Encoded': is_base64,
+        'requestContext': {
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(time.time() * 1000),
+            'http': {
+                'method': scope['method'],
+                'path': path,
+                'sourceIp': client[0]
+            }
+        }
+    }
+
+
+async def send_response(send, response: dict) -> None:
+    """Ответ handler'а в HTTP, с декодированием base64-тела"""
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        payload = base64.b64decode(body)
+    else:
+        payload = body.encode('utf-8')
+
+    headers = [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in (response.get('headers') or {}).items()]
+    headers.append((b'content-length', str(len(payload)).encode()))
+
+    await send({'type': 'http.response.start', 'status': response.get('statusCode', 200), 'headers': headers})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+def error_response(message: str, status_code: int) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
+
+
+app = Server()
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        'app:app',
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=SHUTDOWN_TIMEOUT
+    )
+
+
+if __name__ == '__main__':
+    sys.exit(main())